@@ -1,13 +1,36 @@
 import openai
+from contextlib import nullcontext
 from datetime import datetime
 import json
+import logging
 import os
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+from django.conf import settings
+from knowledge_base.embeddings import encode
 from knowledge_base.services import query_knowledge
+from op_mental import llm
+from op_mental.concurrency import run_blocking
+from op_mental.llm import LLMError
+from op_mental.prompt_budget import PromptBuilder, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Prompt size limits, in tokens. The instructions and the current message are
+# always sent; summary, recent turns, knowledge and retrieved history share the
+# rest of CHAT_PROMPT_TOKEN_BUDGET in that order, each up to its own cap.
+CHAT_PROMPT_TOKEN_BUDGET = getattr(settings, "CHAT_PROMPT_TOKEN_BUDGET", 3500)
+CHAT_MESSAGE_MAX_TOKENS = getattr(settings, "CHAT_MESSAGE_MAX_TOKENS", 500)
+CHAT_SUMMARY_MAX_TOKENS = getattr(settings, "CHAT_SUMMARY_MAX_TOKENS", 300)
+CHAT_RECENT_MAX_TOKENS = getattr(settings, "CHAT_RECENT_MAX_TOKENS", 1200)
+CHAT_KNOWLEDGE_MAX_TOKENS = getattr(settings, "CHAT_KNOWLEDGE_MAX_TOKENS", 600)
+CHAT_CONTEXT_MAX_TOKENS = getattr(settings, "CHAT_CONTEXT_MAX_TOKENS", 400)
+# Turns always kept verbatim, and how many older turns build up before they are
+# folded into the rolling summary (one summary call per that many turns).
+CHAT_RECENT_TURNS = getattr(settings, "CHAT_RECENT_TURNS", 4)
+CHAT_SUMMARY_EVERY_TURNS = getattr(settings, "CHAT_SUMMARY_EVERY_TURNS", 6)
 
 # It's better to handle configuration in Django's settings.py
 # For now, we load it here for simplicity.
@@ -15,10 +38,10 @@ class ChatSystem:
     def __init__(self):
         load_dotenv()
         openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
         self.conversation_history = []
         self.embeddings = []
         self.index = None
+        self._index_lock = nullcontext()
         
     def add_to_memory(self, message: str, response: str):
         """Add conversation to memory with embeddings"""
@@ -31,7 +54,7 @@ class ChatSystem:
         })
         
         # Create embedding
-        embedding = self.model.encode([conversation])
+        embedding = encode([conversation]).embeddings
         self.embeddings.append(embedding[0])
         
         # Update FAISS index
@@ -45,19 +68,28 @@ class ChatSystem:
             self.index = faiss.IndexFlatIP(dimension)
             self.index.add(embeddings_array)
     
-    def get_relevant_context(self, query: str, top_k: int = 3) -> List[Dict]:
+    def get_relevant_context(self, query: str, top_k: int = 3, before: Optional[int] = None) -> List[Dict]:
+        """Most relevant past conversations; with ``before``, only among the first ``before`` entries."""
         if self.index is None or len(self.conversation_history) == 0:
             return []
         
-        query_embedding = self.model.encode([query]).astype('float32')
-        scores, indices = self.index.search(query_embedding, min(top_k, len(self.conversation_history)))
+        total = len(self.conversation_history)
+        if before is None:
+            before = total
+        if before <= 0:
+            return []
+        query_embedding = encode([query]).embeddings
+        with self._index_lock:
+            # A shared index (use_memory) may already hold turns newer than our history.
+            size = self.index.ntotal
+            scores, indices = self.index.search(query_embedding, min(top_k + size - before, size))
         
         relevant_context = []
         for i, idx in enumerate(indices[0]):
-            if scores[0][i] > 0.3:  # Threshold for relevance
+            if 0 <= idx < before and scores[0][i] > 0.3:  # Threshold for relevance
                 relevant_context.append(self.conversation_history[idx])
         
-        return relevant_context
+        return relevant_context[:top_k]
     
     def generate_summary(self) -> str:
         if not self.conversation_history:
@@ -83,29 +115,54 @@ class ChatSystem:
         """
         
         try:
-            response = openai.ChatCompletion.create(
+            return llm.chat(
+                "chatbot.summary",
+                [{"role": "user", "content": summary_prompt}],
                 model="gpt-4",
-                messages=[{"role": "user", "content": summary_prompt}],
                 max_tokens=500
             )
-            return response.choices[0].message.content
-        except Exception as e:
+        except LLMError as e:
             return f"Error generating summary: {str(e)}"
 
     def load_history(self, history: List[Dict]):
-        """Load conversation history from a list of dicts (e.g., from a database)."""
+        """
+        Load conversation history from a list of dicts (e.g., from a database).
+
+        Entries may carry a precomputed "embedding" (see ChatMessage.embedding);
+        only entries without one are encoded, in a single batch.
+        """
         self.conversation_history = history
         self.embeddings = []
         if self.conversation_history:
-            for conv in self.conversation_history:
-                embedding = self.model.encode([conv['full_conversation']])
-                self.embeddings.append(embedding[0])
+            missing = [conv for conv in self.conversation_history if conv.get('embedding') is None]
+            if missing:
+                encoded = encode([conv['full_conversation'] for conv in missing]).embeddings
+                for conv, embedding in zip(missing, encoded):
+                    conv['embedding'] = embedding
+            self.embeddings = [conv['embedding'] for conv in self.conversation_history]
             self._update_faiss_index()
 
+    def use_memory(self, memory):
+        """
+        Use a session's cached SessionMemory (see chatbot/memory_index.py) as the
+        history and index, instead of building them with load_history().
+        """
+        with memory.lock:
+            self.conversation_history = list(memory.turns)
+            self.index = memory.index
+        self._index_lock = memory.lock
+
 
 class GeneralChatSystem(ChatSystem):
     def __init__(self):
         super().__init__()
+        # Rolling summary of the first summarized_count turns (history entries);
+        # the turns after it go into the prompt verbatim (see set_rolling_summary).
+        self.rolling_summary = ""
+        self.summarized_count = 0
+        self.prompt_usage: Dict[str, int] = {}
+        # Set when the last reply was the fallback message (the LLM call failed).
+        self.fell_back = False
         self.system_prompt = """
         You are a compassionate mental health support chatbot following the OP AI Coaching Style Refinement approach. Core principles: 
         
@@ -172,10 +229,68 @@ class GeneralChatSystem(ChatSystem):
         - Emergency Services: 911
         """
     
-    def get_response(self, message: str, age_group: str = "adult") -> str:
-        # Get relevant context from existing history
-        context = self.get_relevant_context(message)
-        context_text = "\n".join([conv['full_conversation'] for conv in context])
+    def set_rolling_summary(self, summary: str, summarized_count: int):
+        """Use a stored rolling summary covering the first ``summarized_count`` turns."""
+        self.rolling_summary = summary or ""
+        self.summarized_count = summarized_count
+
+    @staticmethod
+    def _turn_text(conv: Dict) -> str:
+        lines = []
+        if conv.get('user_message'):
+            lines.append(f"User: {conv['user_message']}")
+        if conv.get('bot_response'):
+            lines.append(f"Coach: {conv['bot_response']}")
+        return "\n".join(lines)
+
+    def recent_turns(self) -> List[str]:
+        """Turns not yet folded into the rolling summary, oldest first."""
+        return [self._turn_text(conv) for conv in self.conversation_history[self.summarized_count:]]
+
+    def turns_to_summarize(self, new_turn: str) -> List[str]:
+        """
+        The oldest unsummarized turns to fold into the summary after ``new_turn``,
+        or [] until CHAT_SUMMARY_EVERY_TURNS turns have built up beyond the
+        CHAT_RECENT_TURNS most recent ones.
+        """
+        pending = self.recent_turns() + [new_turn]
+        if len(pending) - CHAT_RECENT_TURNS < CHAT_SUMMARY_EVERY_TURNS:
+            return []
+        return pending[:-CHAT_RECENT_TURNS]
+
+    def _summary_prompt(self, turns: List[str]) -> str:
+        builder = PromptBuilder(CHAT_PROMPT_TOKEN_BUDGET, model="gpt-4")
+        builder.add("instructions", (
+            "Update the running summary of this mental health support conversation. "
+            "Keep the user's main concerns, feelings, important facts about their situation, "
+            "coping strategies already discussed and any safety concerns. "
+            f"Write plain prose, at most {CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words."
+        ), required=True)
+        builder.add("summary", self.rolling_summary, header="Summary so far:",
+                    required=True, max_tokens=CHAT_SUMMARY_MAX_TOKENS)
+        # Every turn gets its share of the budget, so none is dropped unsummarized.
+        share = (CHAT_PROMPT_TOKEN_BUDGET - CHAT_SUMMARY_MAX_TOKENS - 100) // max(len(turns), 1)
+        builder.add("turns", [truncate_tokens(text, share, "gpt-4") for text in turns],
+                    header="New conversation turns to add to it:")
+        return builder.build()
+
+    def update_summary(self, turns: List[str]) -> Optional[str]:
+        """The rolling summary with ``turns`` folded in, or None if the LLM call failed."""
+        try:
+            return llm.chat(
+                "chatbot.rolling_summary",
+                [{"role": "user", "content": self._summary_prompt(turns)}],
+                model="gpt-4",
+                max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+                temperature=0.3
+            ).strip()
+        except LLMError as e:
+            logger.warning("Rolling summary update failed: %s", e)
+            return None
+
+    def _build_prompt(self, message: str, age_group: str = "adult") -> str:
+        # Relevant older exchanges; the unsummarized ones are sent verbatim below.
+        context = self.get_relevant_context(message, before=self.summarized_count)
         
         age_guidance = {
             "youth": "This user is 17 or younger. Use age-appropriate language and consider guardian involvement for serious concerns.",
@@ -183,54 +298,105 @@ class GeneralChatSystem(ChatSystem):
             "masters": "This user is 40+. Consider comorbidities, life experience, and age-specific challenges."
         }
 
-        ##############################################################
         # Retrieve relevant context from the knowledge base using the RAG pipeline
-        evidence_context = ""
         retrieved = query_knowledge(message, domain="general")
-        if retrieved:
-            evidence_context = "\nRetrieved Insights:\n" + "\n".join(
-                [f"- {doc['title']}: {doc['text'][:120]}..." for doc in retrieved]
-            )
-        ###############################################################
 
-        # ✅ ADDED evidence_context into full_prompt
-        full_prompt = f"""
-        {self.system_prompt}
-        
-        Age Group Guidance: {age_guidance.get(age_group, age_guidance['adult'])}
-        
-        Previous conversation context (if any):
-        {context_text}
-        
-        Retrieved knowledge (from your knowledge base):
-        {evidence_context}
-        
-        Current message: {message}
-        
-        Remember the OP AI Coaching Style:
-        - Ask only ONE question maximum. don't ask lots of questions, give solution as early as possible. 
-        - Explore emotions before solutions
-        - Use collaborative language
-        - Encourage emotion words if the user isn't using them
-        - Remain objective in interpersonal conflicts
-        - Distinguish between wellness vs performance language
-        - Make responses sound warm and conversational, not clinical
-        
-        Respond with empathy and appropriate guidance. If you detect any crisis indicators, prioritize safety resources.
-        """
+        builder = PromptBuilder(CHAT_PROMPT_TOKEN_BUDGET, model="gpt-4")
+        builder.add("instructions", self.system_prompt.strip(), required=True)
+        builder.add("age_guidance", f"Age Group Guidance: {age_guidance.get(age_group, age_guidance['adult'])}",
+                    required=True)
+        builder.add("summary", self.rolling_summary, header="Summary of the earlier conversation:",
+                    max_tokens=CHAT_SUMMARY_MAX_TOKENS, priority=1)
+        builder.add("context", [conv['full_conversation'] for conv in context],
+                    header="Previous conversation context (if any):",
+                    max_tokens=CHAT_CONTEXT_MAX_TOKENS, priority=4, trim_from="end")
+        builder.add("recent_turns", self.recent_turns(), header="Recent conversation:",
+                    max_tokens=CHAT_RECENT_MAX_TOKENS, priority=2)
+        builder.add("knowledge", [f"- {doc['title']}: {doc['text'].strip()}" for doc in retrieved or []],
+                    header="Retrieved knowledge (from your knowledge base):",
+                    max_tokens=CHAT_KNOWLEDGE_MAX_TOKENS, priority=3, trim_from="end")
+        builder.add("message", f"Current message: {message}", required=True, max_tokens=CHAT_MESSAGE_MAX_TOKENS)
+        builder.add("style_reminder", """Remember the OP AI Coaching Style:
+- Ask only ONE question maximum. don't ask lots of questions, give solution as early as possible. 
+- Explore emotions before solutions
+- Use collaborative language
+- Encourage emotion words if the user isn't using them
+- Remain objective in interpersonal conflicts
+- Distinguish between wellness vs performance language
+- Make responses sound warm and conversational, not clinical
+
+Respond with empathy and appropriate guidance. If you detect any crisis indicators, prioritize safety resources.""",
+                    required=True)
+
+        full_prompt = builder.build()
+        self.prompt_usage = builder.usage
+        return full_prompt
+
+    def _fallback_response(self, error: Exception) -> str:
+        self.fell_back = True
+        return f"I'm sorry, I'm having trouble connecting right now. Please try again or contact a mental health professional if this is urgent. Error: {str(error)}"
+
+    def get_response(self, message: str, age_group: str = "adult") -> str:
+        full_prompt = self._build_prompt(message, age_group)
         
         try:
-            response = openai.ChatCompletion.create(
+            bot_response = llm.chat(
+                "chatbot.response",
+                [{"role": "user", "content": full_prompt}],
                 model="gpt-4",
-                messages=[{"role": "user", "content": full_prompt}],
                 max_tokens=800,
                 temperature=0.7
             )
-            
-            bot_response = response.choices[0].message.content
             # The view will be responsible for saving the conversation now
             # self.add_to_memory(message, bot_response) 
             return bot_response
             
-        except Exception as e:
-            return f"I'm sorry, I'm having trouble connecting right now. Please try again or contact a mental health professional if this is urgent. Error: {str(e)}"
+        except LLMError as e:
+            return self._fallback_response(e)
+
+    def stream_response(self, message: str, age_group: str = "adult") -> Iterator[str]:
+        """Yield the reply in pieces as the model generates them (same prompt as get_response)."""
+        full_prompt = self._build_prompt(message, age_group)
+        try:
+            for delta in llm.stream_chat(
+                "chatbot.response",
+                [{"role": "user", "content": full_prompt}],
+                model="gpt-4",
+                max_tokens=800,
+                temperature=0.7
+            ):
+                yield delta
+
+        except LLMError as e:
+            yield self._fallback_response(e)
+
+    async def aget_response(self, message: str, age_group: str = "adult") -> str:
+        """Async get_response: the prompt is built off the event loop and the LLM call is awaited."""
+        full_prompt = await run_blocking(self._build_prompt, message, age_group)
+        try:
+            return await llm.achat(
+                "chatbot.response",
+                [{"role": "user", "content": full_prompt}],
+                model="gpt-4",
+                max_tokens=800,
+                temperature=0.7
+            )
+
+        except LLMError as e:
+            return self._fallback_response(e)
+
+    async def astream_response(self, message: str, age_group: str = "adult") -> AsyncIterator[str]:
+        """Async stream_response."""
+        full_prompt = await run_blocking(self._build_prompt, message, age_group)
+        try:
+            async for delta in llm.astream_chat(
+                "chatbot.response",
+                [{"role": "user", "content": full_prompt}],
+                model="gpt-4",
+                max_tokens=800,
+                temperature=0.7
+            ):
+                yield delta
+
+        except LLMError as e:
+            yield self._fallback_response(e)
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from op_mental.crisis import get_detector
+
+MESSAGES = [
+    "I had a rough day at work and my manager criticised my report in front of everyone.",
+    "I want to be more consistent with my training but I keep skipping sessions.",
+    "My partner and I keep arguing about money and I don't know how to bring it up calmly.",
+    "Honestly I don't want to be alive anymore.",
+    "I've been thinking that everyone would be better off if I just disappeared for good.",
+    "The voices in my head keep telling me I'm worthless.",
+    "Lately nothing around me feels real, like I'm watching a film of my own life.",
+    "I'm so angry at him I could hurt someone.",
+    "I feel stuck and overwhelmed with school, exams are in two weeks.",
+    "Wins are hard for me to notice, but I finally finished my first half marathon!",
+]
+
+# Everyday sports talk that must not be answered with a crisis referral.
+BENIGN_MESSAGES = [
+    "We're going to kill them in the final tomorrow.",
+    "Time to make them pay on the scoreboard after last season.",
+    "There's no way out of this slump, I've missed every shot this week.",
+    "I can't go on running with this ankle injury, should I rest?",
+    "I'm being followed by scouts from two colleges this season.",
+    "My coach is reading my mind, she called the exact play I wanted.",
+    "We watched the Suicide Squad movie after practice.",
+    "I killed it in training today, new personal best on the bench press.",
+    "I want to kill it at the meet this weekend.",
+    "Winning the state final still feels unreal!",
+    "It still doesn't feel real that we made nationals.",
+    "I cut myself while cooking, so no grip work today.",
+    "I don't want to hurt someone's feelings when I give my teammates feedback.",
+    "I'd die on this hill: rest days matter.",
+    "I could kill someone for a coffee after that 5am practice.",
+]
+
+
+class Command(BaseCommand):
+    help = "Per-message cost of the crisis check: the phrase pass alone and the full phrase + embedding check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=50, help="Times each message is checked.")
+
+    def _time(self, fn, rounds):
+        timings = []
+        for _ in range(rounds):
+            for message in MESSAGES:
+                start = time.perf_counter()
+                fn(message)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def handle(self, *args, **options):
+        detector = get_detector()
+        detector.centroids()  # warm the model and the centroids so no timing includes loading them
+
+        self.stdout.write(f"categories: {', '.join(detector.categories)}\n")
+        for message in MESSAGES:
+            signal = detector.detect(message)
+            verdict = f"{signal.category} ({signal.method}, {signal.score:.2f})" if signal else "-"
+            self.stdout.write(f"{verdict:<40} {message[:60]}")
+
+        # Regressions: any verdict here means a false referral that drops the coach's reply.
+        self.stdout.write("\nbenign messages (should all be -):")
+        false_positives = 0
+        for message in BENIGN_MESSAGES:
+            signal = detector.detect(message)
+            false_positives += signal is not None
+            verdict = f"{signal.category} ({signal.method}, {signal.score:.2f})" if signal else "-"
+            self.stdout.write(f"{verdict:<40} {message[:60]}")
+        self.stdout.write(f"false positives: {false_positives}/{len(BENIGN_MESSAGES)}")
+
+        self.stdout.write(f"\n{'check':<24}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, fn in (("phrases", detector.match_phrases), ("phrases + embedding", detector.detect)):
+            p50, p95 = self._time(fn, options["rounds"])
+            self.stdout.write(f"{name:<24}{p50:>10.3f}{p95:>10.3f}")
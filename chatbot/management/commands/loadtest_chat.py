@@ -0,0 +1,139 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import openai
+from aiohttp import web
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chatbot.models import ChatSession
+from subscriptions.models import SubscriptionPlan, UserSubscription
+
+
+class FakeLLMServer:
+    """A local OpenAI-compatible chat completions endpoint that answers after a fixed delay."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+
+    async def _chat_completion(self, request):
+        await asyncio.sleep(self.latency)
+        return web.json_response({
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "I hear you. What feels heaviest right now?"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat_completion)
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def start(self) -> str:
+        threading.Thread(target=self._serve, daemon=True).start()
+        self._started.wait()
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the chatbot message endpoint against a local fake LLM: N sync workers "
+        "(one request each at a time) versus one async event loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=4, help="Sync workers in the baseline.")
+        parser.add_argument("--concurrency", type=int, default=100, help="In-flight requests for the async run.")
+        parser.add_argument("--latency-ms", type=int, default=500, help="Fake LLM response time.")
+
+    def _report(self, name, latencies, elapsed):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{name:<8} {len(latencies) / elapsed:8.1f} req/s   "
+            f"p50 {statistics.median(latencies) * 1000:7.0f} ms   p95 {p95 * 1000:7.0f} ms"
+        )
+
+    def handle(self, *args, **options):
+        server = FakeLLMServer(options["latency_ms"] / 1000)
+        openai.api_base, openai.api_key = server.start(), "loadtest"
+
+        # A subscribed throwaway user, so the free-message limit never kicks in.
+        user = get_user_model().objects.create(username="loadtest-chat", email="loadtest-chat@example.com")
+        plan, plan_created = SubscriptionPlan.objects.get_or_create(
+            name="monthly", defaults={"description": "load test", "price": 1, "duration_days": 30}
+        )
+        UserSubscription.objects.create(user=user, plan=plan, status="active",
+                                        end_date=timezone.now() + timedelta(days=1))
+        session = ChatSession.objects.create(user=user, save_history=False)
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        body = json.dumps({"message": "I feel anxious about tomorrow", "session_id": str(session.id)})
+
+        try:
+            self._run_sync(options, body, headers)
+            self._run_async(options, body, headers)
+        finally:
+            user.delete()
+            if plan_created:
+                plan.delete()
+            server.stop()
+
+    def _run_sync(self, options, body, headers):
+        client = Client()
+
+        def one(_):
+            start = time.perf_counter()
+            response = client.post("/api/chatbot/message/", body, content_type="application/json", headers=headers)
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            latencies = list(pool.map(one, range(options["requests"])))
+        self._report("sync", latencies, time.perf_counter() - start)
+
+    def _run_async(self, options, body, headers):
+        async def run():
+            client = AsyncClient()
+            limit = asyncio.Semaphore(options["concurrency"])
+
+            async def one():
+                async with limit:
+                    start = time.perf_counter()
+                    response = await client.post("/api/chatbot/message/", body,
+                                                 content_type="application/json", headers=headers)
+                    assert response.status_code == 200, response.content
+                    return time.perf_counter() - start
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(one() for _ in range(options["requests"])))
+            return latencies, time.perf_counter() - start
+
+        latencies, elapsed = asyncio.run(run())
+        self._report("async", latencies, elapsed)
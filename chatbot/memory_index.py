@@ -0,0 +1,115 @@
+"""
+Per-session conversation memory, cached in-process.
+
+Retrieval over a session's past turns needs a FAISS index of their vectors.
+Building it on every message means loading every stored vector and adding them
+all again, so it grows with the history. Instead each session's SessionMemory
+(its turns in order plus their index) is kept in an LRU cache, at most
+CHAT_MEMORY_CACHE_SIZE sessions per process, dropped after
+CHAT_MEMORY_CACHE_TTL seconds without a message. Each message only fetches the
+turns saved since the cached copy (usually none, one indexed query) and
+appends them; a saved turn is appended directly. Setting up retrieval for an
+active session therefore costs the same whatever its length.
+
+Every worker holds its own copy. Turns are append-only, so catching up on
+newer rows keeps each copy consistent with the database.
+"""
+import threading
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from knowledge_base.cache import LRUCache
+from knowledge_base.embeddings import encode
+from op_mental.concurrency import run_blocking
+from .models import ChatMessage
+
+CHAT_MEMORY_CACHE_SIZE = getattr(settings, "CHAT_MEMORY_CACHE_SIZE", 256)
+CHAT_MEMORY_CACHE_TTL = getattr(settings, "CHAT_MEMORY_CACHE_TTL", 15 * 60)
+
+
+class SessionMemory:
+    """
+    A session's turns (ChatSystem history entries, oldest first) and a FAISS
+    inner-product index over their vectors, in the same order. ``lock``
+    guards both; readers take a snapshot of ``turns`` and search under it.
+    """
+
+    def __init__(self):
+        self.turns: List[Dict] = []
+        self.index = None
+        self.last_id = 0  # id of the newest assistant message held
+        self.lock = threading.Lock()
+
+    def extend(self, replies: List[ChatMessage]) -> List[ChatMessage]:
+        """
+        Append saved assistant messages (oldest first, reply_to loaded), skipping
+        any already held. Vectors missing on the messages (turns stored before
+        turn pairing) are encoded in one batch and set on them; those messages
+        are returned so the caller can save them.
+        """
+        with self.lock:
+            replies = [reply for reply in replies if reply.id > self.last_id]
+            if not replies:
+                return []
+            entries = [reply.memory_entry() for reply in replies]
+            unembedded = [reply for reply in replies if not reply.embedding]
+            if unembedded:
+                missing = [entry for entry in entries if entry["embedding"] is None]
+                encoded = encode([entry["full_conversation"] for entry in missing]).embeddings
+                for reply, entry, vector in zip(unembedded, missing, encoded):
+                    entry["embedding"] = vector
+                    reply.set_embedding(vector)
+
+            vectors = np.array([entry["embedding"] for entry in entries]).astype('float32')
+            if self.index is None:
+                self.index = faiss.IndexFlatIP(vectors.shape[1])
+            self.index.add(vectors)
+            self.turns.extend(entries)
+            self.last_id = replies[-1].id
+            return unembedded
+
+
+_memories = LRUCache(maxsize=CHAT_MEMORY_CACHE_SIZE, ttl=CHAT_MEMORY_CACHE_TTL, refresh_on_get=True)
+
+
+async def aget_session_memory(session) -> SessionMemory:
+    """The session's memory, caught up with the turns saved since it was cached."""
+    memory = _memories.get(session.id)
+    if memory is None:
+        memory = SessionMemory()
+        _memories.set(session.id, memory)
+    replies = [
+        reply async for reply in ChatMessage.objects.filter(
+            session=session, role='assistant', id__gt=memory.last_id
+        ).select_related('reply_to').order_by('created_at', 'id')
+    ]
+    if replies:
+        unembedded = await run_blocking(memory.extend, replies)
+        if unembedded:
+            # Keep the vectors, so they are only computed once.
+            await ChatMessage.objects.abulk_update(unembedded, ['embedding'])
+    return memory
+
+
+def remember_turn(session, reply: ChatMessage) -> None:
+    """Append a just-saved assistant message to the session's cached memory, if it has one."""
+    memory = _memories.get(session.id)
+    if memory is None:
+        return
+    if reply.id >= memory.last_id:
+        memory.extend([reply])
+    else:
+        # A concurrent turn was appended first; rebuild on the next message
+        # rather than lose this one.
+        forget_session(session.id)
+
+
+def forget_session(session_id) -> None:
+    _memories.delete(session_id)
+
+
+def stats() -> Dict[str, int]:
+    return _memories.stats()
@@ -0,0 +1,77 @@
+"""
+Free-tier message metering, shared by the coaches.
+
+Each message from a user without an active subscription (checked against the
+cached entitlement, see subscriptions/entitlements.py) is charged with one
+conditional UPDATE (``message_count = message_count + 1 WHERE message_count <
+limit``) on their UserChatCounter row: the limit check and the increment happen
+in the database in one statement, so concurrent messages cannot both slip
+under the limit or lose an increment. The row is created on the user's first
+metered message.
+
+The counter is shared: every coach listed in FREE_TIER_METERED_COACHES draws
+from the same FREE_MESSAGE_LIMIT allowance.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from subscriptions.entitlements import aget_entitlement, get_entitlement
+from .models import UserChatCounter
+
+FREE_MESSAGE_LIMIT = getattr(settings, "FREE_MESSAGE_LIMIT", 30)
+FREE_TIER_METERED_COACHES = getattr(settings, "FREE_TIER_METERED_COACHES", ["chatbot"])
+LIMIT_REACHED_MESSAGE = "You have reached your free message limit. Please subscribe for unlimited access."
+
+
+class MessageMeter:
+    def __init__(self, limit: int = FREE_MESSAGE_LIMIT, coaches=FREE_TIER_METERED_COACHES):
+        self.limit = limit
+        self.coaches = set(coaches)
+
+    def _increment(self, user):
+        return UserChatCounter.objects.filter(user=user, message_count__lt=self.limit).update(
+            message_count=F('message_count') + 1
+        )
+
+    def _aincrement(self, user):
+        return UserChatCounter.objects.filter(user=user, message_count__lt=self.limit).aupdate(
+            message_count=F('message_count') + 1
+        )
+
+    def charge(self, user, coach: str = "chatbot") -> bool:
+        """Count one message; False if the user is over the free limit (and nothing was counted)."""
+        if coach not in self.coaches or get_entitlement(user).subscribed:
+            return True
+        if self._increment(user):
+            return True
+        if self.limit <= 0:
+            return False
+        try:
+            with transaction.atomic():  # savepoint, in case the caller is inside a transaction
+                UserChatCounter.objects.create(user=user, message_count=1)
+            return True
+        except IntegrityError:
+            # The row exists (or a concurrent first message just created it).
+            return bool(self._increment(user))
+
+    async def acharge(self, user, coach: str = "chatbot") -> bool:
+        """Async charge()."""
+        if coach not in self.coaches or (await aget_entitlement(user)).subscribed:
+            return True
+        if await self._aincrement(user):
+            return True
+        if self.limit <= 0:
+            return False
+        try:
+            await UserChatCounter.objects.acreate(user=user, message_count=1)
+            return True
+        except IntegrityError:
+            return bool(await self._aincrement(user))
+
+    def remaining(self, user) -> int:
+        counter = UserChatCounter.objects.filter(user=user).first()
+        return max(self.limit - (counter.message_count if counter else 0), 0)
+
+
+meter = MessageMeter()
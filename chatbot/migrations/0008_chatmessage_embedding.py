@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def pair_turns(apps, schema_editor):
+    """Link each assistant message to the user message just before it."""
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+
+    for session_id in ChatSession.objects.values_list('id', flat=True).iterator():
+        previous = None
+        linked = []
+        for message in ChatMessage.objects.filter(session_id=session_id).order_by('created_at', 'id').only('id', 'role'):
+            if message.role == 'assistant' and previous is not None and previous.role == 'user':
+                message.reply_to_id = previous.id
+                linked.append(message)
+            previous = message
+        ChatMessage.objects.bulk_update(linked, ['reply_to'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_chatsession_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='reply_to',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replies', to='chatbot.chatmessage'),
+        ),
+        migrations.RunPython(pair_turns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_chatmessage_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='summarized_turn_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='summary',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0009_chatsession_rolling_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'created_at', 'id'], name='chat_message_session_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='chat_session_user_keyset'),
+        ),
+    ]
@@ -20,8 +20,10 @@ class UserChatCounter(models.Model):
         db_table = 'user_chat_counters'
 
 import uuid
+import numpy as np
 from django.conf import settings
 from django.db import models
+from knowledge_base.embeddings import encode
 
 class ChatSession(models.Model):
     """Stores a chat session, with an option to save the history."""
@@ -29,21 +31,73 @@ class ChatSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions')
     title = models.CharField(max_length=100, blank=True, null=True)
     save_history = models.BooleanField(default=False)
+    # Rolling summary of the oldest turns, so prompts carry it instead of the
+    # full history. It covers the first summarized_turn_count turns and is
+    # refreshed every CHAT_SUMMARY_EVERY_TURNS turns (see ChatbotApiView.save_turn).
+    summary = models.TextField(blank=True, default='', editable=False)
+    summarized_turn_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"ChatSession {self.id} for {self.user.username}"
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's sessions (see op_mental/pagination.py)
+            models.Index(fields=['user', 'created_at', 'id'], name='chat_session_user_keyset'),
+        ]
+
 class ChatMessage(models.Model):
-    """Stores a single message within a chat session."""
+    """
+    Stores a single message within a chat session. An assistant message points
+    to the user message it answers (reply_to); together they are one turn, and
+    the turn is what the chatbot's memory embeds and retrieves.
+    """
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=10, choices=[('user', 'User'), ('assistant', 'Assistant')])
     message = models.TextField()
+    reply_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='replies', editable=False)
+    # Embedding of the turn's memory_text() as float16 bytes, kept on the
+    # assistant message and computed once, so loading the session's memory
+    # never re-runs the model. User messages have none.
+    embedding = models.BinaryField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.role}: {self.message[:50]}"
 
+    def memory_text(self) -> str:
+        # The text ChatSystem indexes for the turn this assistant message closes.
+        user_message = self.reply_to.message if self.reply_to_id else ''
+        return f"User: {user_message}\nBot: {self.message}"
+
+    def memory_entry(self) -> dict:
+        """This turn as a ChatSystem history entry (reply_to should be select_related)."""
+        return {
+            "user_message": self.reply_to.message if self.reply_to_id else None,
+            "bot_response": self.message,
+            "full_conversation": self.memory_text(),
+            "embedding": self.embedding_vector(),
+        }
+
+    def embedding_vector(self):
+        if not self.embedding:
+            return None
+        return np.frombuffer(bytes(self.embedding), dtype=np.float16).astype('float32')
+
+    def set_embedding(self, vector):
+        self.embedding = np.asarray(vector).astype(np.float16).tobytes()
+
+    def save(self, *args, **kwargs):
+        if self.role == 'assistant' and not self.embedding and self.message:
+            self.set_embedding(encode([self.memory_text()]).embeddings[0])
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ['created_at']
\ No newline at end of file
+        ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a session's messages (see op_mental/pagination.py)
+            models.Index(fields=['session', 'created_at', 'id'], name='chat_message_session_keyset'),
+        ]
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Semantic cache of general-chat replies to stateless questions.
+
+Opt-in (CHAT_RESPONSE_CACHE_ENABLED). Only messages from sessions that do not
+save history, that the crisis check did not flag, and that are at most
+CHAT_RESPONSE_CACHE_MAX_CHARS long are looked up or stored. The prompt for
+such a message holds nothing but the message, the age group and knowledge-base
+excerpts, so the reply to one question also answers a near-identical one.
+
+Entries are grouped by (age_group, knowledge corpus key); a message is answered
+from the cache when a stored question in its group has a cosine similarity of
+at least CHAT_RESPONSE_CACHE_THRESHOLD. Entries expire CHAT_RESPONSE_CACHE_TTL
+seconds after they are stored, each group keeps at most
+CHAT_RESPONSE_CACHE_SIZE entries (oldest dropped first), and groups for an
+older knowledge corpus are dropped once the corpus changes. The cache is per
+process.
+"""
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from knowledge_base.embeddings import encode
+from knowledge_base.services import knowledge_version
+
+CHAT_RESPONSE_CACHE_ENABLED = getattr(settings, "CHAT_RESPONSE_CACHE_ENABLED", False)
+CHAT_RESPONSE_CACHE_THRESHOLD = getattr(settings, "CHAT_RESPONSE_CACHE_THRESHOLD", 0.95)
+CHAT_RESPONSE_CACHE_TTL = getattr(settings, "CHAT_RESPONSE_CACHE_TTL", 6 * 60 * 60)
+CHAT_RESPONSE_CACHE_SIZE = getattr(settings, "CHAT_RESPONSE_CACHE_SIZE", 2000)
+CHAT_RESPONSE_CACHE_MAX_CHARS = getattr(settings, "CHAT_RESPONSE_CACHE_MAX_CHARS", 300)
+
+
+class ResponseCacheProbe(NamedTuple):
+    vector: np.ndarray  # normalized embedding of the message
+    key: Tuple  # (age_group, knowledge corpus key)
+
+
+class _Group:
+    def __init__(self, dimension: int):
+        self.vectors = np.zeros((0, dimension), dtype='float32')
+        self.replies = []
+        self.stored_at = []
+
+    def drop_oldest(self, count: int) -> None:
+        self.vectors = self.vectors[count:]
+        del self.replies[:count]
+        del self.stored_at[:count]
+
+
+class SemanticResponseCache:
+    def __init__(self, threshold: float = CHAT_RESPONSE_CACHE_THRESHOLD, ttl: float = CHAT_RESPONSE_CACHE_TTL,
+                 maxsize: int = CHAT_RESPONSE_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._groups: Dict[Tuple, _Group] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, group: _Group) -> None:
+        cutoff = time.monotonic() - self.ttl
+        expired = 0
+        while expired < len(group.stored_at) and group.stored_at[expired] < cutoff:
+            expired += 1
+        if expired:
+            group.drop_oldest(expired)
+
+    def lookup(self, message: str, age_group: Optional[str]) -> Tuple[ResponseCacheProbe, Optional[str]]:
+        """
+        Encode the message and look it up. Returns the probe (pass it to store()
+        after a miss) and the cached reply, or None.
+        """
+        probe = ResponseCacheProbe(
+            encode([message], normalize=True).embeddings[0], (age_group, knowledge_version())
+        )
+        with self._lock:
+            group = self._groups.get(probe.key)
+            if group is not None:
+                self._expire(group)
+            if group is None or not group.replies:
+                self.misses += 1
+                return probe, None
+            similarities = group.vectors @ probe.vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return probe, None
+            self.hits += 1
+            return probe, group.replies[best]
+
+    def store(self, probe: ResponseCacheProbe, reply: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            # Groups for an older knowledge corpus can no longer be hit.
+            for key in [key for key in self._groups if key[1] != probe.key[1]]:
+                del self._groups[key]
+            group = self._groups.get(probe.key)
+            if group is None:
+                group = self._groups[probe.key] = _Group(probe.vector.shape[0])
+            self._expire(group)
+            group.vectors = np.vstack([group.vectors, probe.vector[None, :]])
+            group.replies.append(reply)
+            group.stored_at.append(time.monotonic())
+            if len(group.replies) > self.maxsize:
+                group.drop_oldest(len(group.replies) - self.maxsize)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._groups.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": sum(len(group.replies) for group in self._groups.values()),
+                "groups": len(self._groups),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def is_cacheable(session, message: str) -> bool:
+    """Whether a (crisis-free) message may be answered from, and stored in, the response cache."""
+    return (
+        CHAT_RESPONSE_CACHE_ENABLED
+        and not session.save_history
+        and len(message) <= CHAT_RESPONSE_CACHE_MAX_CHARS
+    )
+
+
+response_cache = SemanticResponseCache()
@@ -26,4 +26,5 @@ class ChatSessionSerializer(serializers.ModelSerializer):
 class ChatResponseSerializer(serializers.Serializer):
     """Serializer for the chatbot's response."""
     reply = serializers.CharField()
-    session_id = serializers.UUIDField()
\ No newline at end of file
+    session_id = serializers.UUIDField()
+    crisis = serializers.BooleanField(default=False)
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     StartChatSessionView,
     ChatbotApiView,
+    ChatbotStreamApiView,
     ChatHistoryView,
     ChatHistoryDetailView
 )
@@ -14,6 +15,9 @@ urlpatterns = [
     # Endpoint to send a message to an existing session
     path('message/', ChatbotApiView.as_view(), name='chatbot_message'),
 
+    # Same as message/, but the reply is streamed as Server-Sent Events
+    path('message/stream/', ChatbotStreamApiView.as_view(), name='chatbot_message_stream'),
+
     # Endpoint to get all saved chat sessions for a user
     path('history/', ChatHistoryView.as_view(), name='chatbot_history'),
 
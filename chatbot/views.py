@@ -1,11 +1,19 @@
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
+from adrf.shortcuts import aget_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.http import StreamingHttpResponse
+import functools
+import json
+import logging
+import threading
 import uuid
 
-from .models import ChatSession, ChatMessage, UserChatCounter
+from .models import ChatSession, ChatMessage
 from .serializers import (
     StartChatSessionSerializer,
     ChatRequestSerializer,
@@ -14,8 +22,27 @@ from .serializers import (
     ChatMessageSerializer
 )
 from .chatbot_logic import GeneralChatSystem
-from subscriptions.models import UserSubscription
-from django.utils import timezone
+from .memory_index import aget_session_memory, forget_session, remember_turn
+from .metering import LIMIT_REACHED_MESSAGE, meter
+from .response_cache import is_cacheable, response_cache
+from subscriptions.permissions import HasCoachEntitlement
+from op_mental.concurrency import run_blocking, submit_blocking
+from op_mental.pagination import KeysetPagination
+from op_mental.crisis import crisis_response, detect_crisis
+
+logger = logging.getLogger(__name__)
+
+# Rolling-summary refreshes running on the coach thread pool after their turn's
+# response went out, by session id (at most one per session).
+_summary_refreshes = {}
+_summary_refreshes_lock = threading.Lock()
+
+
+def _summary_refresh_done(session_id, future):
+    with _summary_refreshes_lock:
+        _summary_refreshes.pop(session_id, None)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Rolling summary refresh failed for session %s", session_id, exc_info=future.exception())
 
 class StartChatSessionView(APIView):
     """API view to start a new chat session."""
@@ -33,15 +60,25 @@ class StartChatSessionView(APIView):
 
         return Response({'session_id': session.id}, status=status.HTTP_201_CREATED)
 
-class ChatbotApiView(APIView):
-    """API view to interact with the chatbot."""
-    permission_classes = [IsAuthenticated]
+class ChatbotApiView(AsyncAPIView):
+    """
+    API view to interact with the chatbot.
 
-    def post(self, request, *args, **kwargs):
+    Async: under ASGI the LLM round-trip is awaited, so a worker is not held
+    while the reply is generated.
+    """
+    permission_classes = [IsAuthenticated, HasCoachEntitlement]
+    coach_name = "chatbot"
+
+    async def prepare_turn(self, request):
+        """
+        Validate the request, apply the subscription/free-message checks and load
+        the session history. Returns (error_response, None) or (None, turn).
+        """
         print("Incoming Chat Request Data:", request.data)
         serializer = ChatRequestSerializer(data=request.data)
         if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST), None
 
         validated_data = serializer.validated_data
         user = request.user
@@ -49,84 +86,206 @@ class ChatbotApiView(APIView):
         user_message = validated_data['message']
         age_group = validated_data.get('age_group')
 
-        session = get_object_or_404(ChatSession, id=session_id, user=user)
-
-        # Check for an active subscription
-        has_active_subscription = UserSubscription.objects.filter(
-            user=user,
-            status='active',
-            end_date__gte=timezone.now()
-        ).exists()
-
-        # If user is not subscribed, check their message count
-        if not has_active_subscription:
-            counter, created = UserChatCounter.objects.get_or_create(user=user)
-            if counter.message_count >= 30:
-                return Response(
-                    {
-                        "reply": "You have reached your free message limit. Please subscribe for unlimited access.",
-                        "session_id": session_id
-                    },
-                    status=status.HTTP_208_ALREADY_REPORTED
-                )
-            counter.message_count += 1
-            counter.save()
+        session = await aget_object_or_404(ChatSession, id=session_id, user=user)
+
+        # Crisis check before anything slow: safety resources go out without
+        # waiting on the LLM, and regardless of the free-message limit.
+        crisis = await run_blocking(detect_crisis, user_message)
+        if crisis is not None and not getattr(settings, "CRISIS_FOLLOW_WITH_REPLY", False):
+            return None, {
+                "session": session,
+                "session_id": session_id,
+                "user_message": user_message,
+                "age_group": age_group,
+                "chat_system": None,
+                "crisis": crisis,
+                "cache_probe": None,
+                "cached_reply": None,
+            }
+
+        # Free-tier metering: one atomic conditional increment (subscribers pass).
+        # A crisis message is never refused or counted.
+        if crisis is None and not await meter.acharge(user, self.coach_name):
+            return Response(
+                {
+                    "reply": LIMIT_REACHED_MESSAGE,
+                    "session_id": session_id
+                },
+                status=status.HTTP_208_ALREADY_REPORTED
+            ), None
 
         # If the session doesn't have a title, create one from the first message
         if not session.title and session.save_history:
             session.title = ' '.join(user_message.split()[:5]) # Use first 5 words
-            session.save()
+            await session.asave()
 
-        # Load history from the database if saving is enabled
-        history = []
+        # Initialize the chatbot logic. With saving enabled, its memory is the
+        # session's cached turn index, caught up with any newer saved turns.
+        chat_system = GeneralChatSystem()
         if session.save_history:
-            history = session.messages.all()
+            chat_system.use_memory(await aget_session_memory(session))
+        chat_system.set_rolling_summary(session.summary, session.summarized_turn_count)
 
-        formatted_history = []
-        for item in history:
-            formatted_history.append({
-                "user_message": item.message if item.role == 'user' else None,
-                "bot_response": item.message if item.role == 'assistant' else None,
-                "full_conversation": f"User: {item.message if item.role == 'user' else ''}\nBot: {item.message if item.role == 'assistant' else ''}"
-            })
+        # A stateless general question may already have been answered.
+        cache_probe = cached_reply = None
+        if crisis is None and is_cacheable(session, user_message):
+            cache_probe, cached_reply = await run_blocking(response_cache.lookup, user_message, age_group)
+        return None, {
+            "session": session,
+            "session_id": session_id,
+            "user_message": user_message,
+            "age_group": age_group,
+            "chat_system": chat_system,
+            "crisis": crisis,
+            "cache_probe": cache_probe,
+            "cached_reply": cached_reply,
+        }
 
-        # Initialize and run the chatbot logic
-        chat_system = GeneralChatSystem()
-        chat_system.load_history(formatted_history)
-        bot_response = chat_system.get_response(user_message, age_group)
+    def cache_reply(self, turn, bot_response):
+        # Only a real reply to a cacheable message (see chatbot/response_cache.py) is kept.
+        if turn["cache_probe"] is not None and not turn["chat_system"].fell_back:
+            response_cache.store(turn["cache_probe"], bot_response)
 
+    async def save_turn(self, turn, bot_response):
         # Save the conversation to the database if saving is enabled
+        session = turn["session"]
         if session.save_history:
-            ChatMessage.objects.create(session=session, role='user', message=user_message)
-            ChatMessage.objects.create(session=session, role='assistant', message=bot_response)
+            # Saving the reply embeds the whole turn, so keep it off the event loop.
+            user_msg = await ChatMessage.objects.acreate(session=session, role='user', message=turn["user_message"])
+            reply = await run_blocking(
+                ChatMessage.objects.create,
+                session=session, role='assistant', message=bot_response, reply_to=user_msg,
+            )
+            remember_turn(session, reply)
+            if turn["chat_system"] is not None:
+                # Off the response path: the summary's LLM call must not delay this turn.
+                # It runs on the coach pool rather than as a task on this request's event
+                # loop, which under WSGI is torn down (cancelling its tasks) with the request.
+                # While one is running for the session, later turns leave it be (the
+                # next turn after it finishes picks up anything still unsummarized).
+                with _summary_refreshes_lock:
+                    if session.id in _summary_refreshes:
+                        return
+                    future = _summary_refreshes[session.id] = submit_blocking(
+                        self.refresh_summary, turn, bot_response
+                    )
+                future.add_done_callback(functools.partial(_summary_refresh_done, session.id))
+
+    def refresh_summary(self, turn, bot_response):
+        """
+        Fold the oldest unsummarized turns into the session's rolling summary
+        once enough have built up (see GeneralChatSystem.turns_to_summarize).
+        Runs on the coach thread pool, started by save_turn.
+        """
+        session = turn["session"]
+        chat_system = turn["chat_system"]
+        to_summarize = chat_system.turns_to_summarize(
+            f"User: {turn['user_message']}\nCoach: {bot_response}"
+        )
+        if not to_summarize:
+            return
+        summary = chat_system.update_summary(to_summarize)
+        if not summary:
+            return  # keep the old summary; the next turn tries again
+        # Conditional on the count we summarized from, so a concurrent turn on
+        # the same session cannot fold the same turns twice.
+        ChatSession.objects.filter(
+            id=session.id, summarized_turn_count=session.summarized_turn_count
+        ).update(summary=summary, summarized_turn_count=session.summarized_turn_count + len(to_summarize))
+
+    async def post(self, request, *args, **kwargs):
+        error_response, turn = await self.prepare_turn(request)
+        if error_response is not None:
+            return error_response
+
+        if turn["crisis"] is None:
+            bot_response = turn["cached_reply"]
+            if bot_response is None:
+                bot_response = await turn["chat_system"].aget_response(turn["user_message"], turn["age_group"])
+                self.cache_reply(turn, bot_response)
+        else:
+            bot_response = crisis_response(turn["crisis"])
+            if turn["chat_system"] is not None:  # CRISIS_FOLLOW_WITH_REPLY
+                reply = await turn["chat_system"].aget_response(turn["user_message"], turn["age_group"])
+                bot_response = f"{bot_response}\n\n{reply}"
+        await self.save_turn(turn, bot_response)
 
         response_serializer = ChatResponseSerializer({
             'reply': bot_response,
-            'session_id': session_id
+            'session_id': turn["session_id"],
+            'crisis': turn["crisis"] is not None,
         })
 
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
+class ChatbotStreamApiView(ChatbotApiView):
+    """
+    Same as ChatbotApiView, but the reply is sent as Server-Sent Events while it
+    is generated: one "data: {"delta": ...}" event per piece, then a "done"
+    event with the full reply. When the crisis check fires, a "crisis" event
+    with the safety resources comes first, before any LLM call. Validation
+    errors and the free-message limit are returned as the usual JSON responses.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        error_response, turn = await self.prepare_turn(request)
+        if error_response is not None:
+            return error_response
+
+        response = StreamingHttpResponse(self._events(turn), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+        return response
+
+    async def _events(self, turn):
+        pieces = []
+        try:
+            if turn["crisis"] is not None:
+                pieces.append(crisis_response(turn["crisis"]))
+                yield f"event: crisis\ndata: {json.dumps({'reply': pieces[0]})}\n\n"
+            if turn["cached_reply"] is not None:
+                pieces.append(turn["cached_reply"])
+                yield f"data: {json.dumps({'delta': pieces[0]})}\n\n"
+            elif turn["chat_system"] is not None:
+                if pieces:
+                    pieces.append("\n\n")
+                async for delta in turn["chat_system"].astream_response(turn["user_message"], turn["age_group"]):
+                    pieces.append(delta)
+                    yield f"data: {json.dumps({'delta': delta})}\n\n"
+                self.cache_reply(turn, ''.join(pieces))
+            done = {'reply': ''.join(pieces), 'session_id': str(turn["session_id"])}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        finally:
+            # Runs when the stream ends or the client disconnects; the message was already counted.
+            if pieces:
+                await self.save_turn(turn, ''.join(pieces))
+
 class ChatHistoryView(APIView):
-    """API view to list all saved chat sessions for a user."""
+    """API view to list a user's saved chat sessions, newest first, one keyset page at a time."""
     permission_classes = [IsAuthenticated]
+    keyset_descending = True
 
     def get(self, request, *args, **kwargs):
-        sessions = ChatSession.objects.filter(user=request.user, save_history=True).order_by('-updated_at')
+        paginator = KeysetPagination()
+        sessions = paginator.paginate_queryset(
+            ChatSession.objects.filter(user=request.user, save_history=True), request, view=self
+        )
         serializer = ChatSessionSerializer(sessions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
 class ChatHistoryDetailView(APIView):
-    """API view to retrieve or delete a specific chat session."""
+    """API view to retrieve (one keyset page of messages, oldest first) or delete a specific chat session."""
     permission_classes = [IsAuthenticated]
 
     def get(self, request, session_id, *args, **kwargs):
         session = get_object_or_404(ChatSession, id=session_id, user=request.user)
-        messages = session.messages.all()
+        paginator = KeysetPagination()
+        messages = paginator.paginate_queryset(session.messages.all(), request, view=self)
         serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
     def delete(self, request, session_id, *args, **kwargs):
         session = get_object_or_404(ChatSession, id=session_id, user=request.user)
         session.delete()
+        forget_session(session.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
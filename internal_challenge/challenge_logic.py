@@ -6,11 +6,13 @@ from enum import Enum
 import re
 from dotenv import load_dotenv
 from knowledge_base.services import query_knowledge  # Import query function from knowledge service
+from op_mental.keywords import KeywordMatcher
 
 load_dotenv()
 
 try:
     import openai
+    from op_mental import llm
     openai.api_key = os.getenv('OPENAI_API_KEY')
     OPENAI_AVAILABLE = True
 except ImportError:
@@ -33,6 +35,17 @@ class ChallengeType(Enum):
     PERFORMANCE_BLOCKS = "Performance Blocks"
     GENERAL = "General Challenge"
 
+CHALLENGE_KEYWORDS = {
+    ChallengeType.MOOD_DISORDERS: ['depressed', 'anxious', 'mood', 'panic', 'sad', 'hopeless', 'anxiety', 'depression'],
+    ChallengeType.TRAUMA: ['trauma', 'abuse', 'ptsd', 'flashback', 'triggered', 'traumatic'],
+    ChallengeType.RELATIONSHIP_CONFLICT: ['relationship', 'conflict', 'argument', 'partner', 'friend', 'family'],
+    ChallengeType.MOTIVATION_ISSUES: ['motivation', 'procrastination', 'lazy', 'unmotivated', 'procrastinate'],
+    ChallengeType.NARRATIVE_ISSUES: ['story', 'narrative', 'identity', 'who am i', 'sense of self'],
+    ChallengeType.SELF_DOUBT: ['imposter', 'fraud', 'not good enough', 'self-doubt', 'doubt myself'],
+    ChallengeType.PERFORMANCE_BLOCKS: ['performance', 'block', 'stuck', 'can\'t perform', 'blocked']
+}
+CHALLENGE_MATCHER = KeywordMatcher(CHALLENGE_KEYWORDS)
+
 class QuestionState(Enum):
     PENDING = "pending"
     ANSWERED = "answered"
@@ -263,23 +276,8 @@ class InternalChallengeTherapySystem:
             return False, f"Please provide at least {min_items} items in your response. You can separate them with commas, line breaks, or bullet points."
 
     def identify_challenge_type(self, message: str) -> ChallengeType:
-        message_lower = message.lower()
-        
-        challenge_keywords = {
-            ChallengeType.MOOD_DISORDERS: ['depressed', 'anxious', 'mood', 'panic', 'sad', 'hopeless', 'anxiety', 'depression'],
-            ChallengeType.TRAUMA: ['trauma', 'abuse', 'ptsd', 'flashback', 'triggered', 'traumatic'],
-            ChallengeType.RELATIONSHIP_CONFLICT: ['relationship', 'conflict', 'argument', 'partner', 'friend', 'family'],
-            ChallengeType.MOTIVATION_ISSUES: ['motivation', 'procrastination', 'lazy', 'unmotivated', 'procrastinate'],
-            ChallengeType.NARRATIVE_ISSUES: ['story', 'narrative', 'identity', 'who am i', 'sense of self'],
-            ChallengeType.SELF_DOUBT: ['imposter', 'fraud', 'not good enough', 'self-doubt', 'doubt myself'],
-            ChallengeType.PERFORMANCE_BLOCKS: ['performance', 'block', 'stuck', 'can\'t perform', 'blocked']
-        }
-        
-        for challenge_type, keywords in challenge_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return challenge_type
-        
-        return ChallengeType.GENERAL
+        # The first type, in CHALLENGE_KEYWORDS order, with a keyword in the message.
+        return CHALLENGE_MATCHER.first(message) or ChallengeType.GENERAL
     
     def get_current_question(self) -> Optional[Dict]:
         phase_questions = self.phase_questions.get(self.current_phase, [])
@@ -425,21 +423,18 @@ class InternalChallengeTherapySystem:
             Use evidence-based therapeutic language while remaining compassionate and strengths-focused. Highlight concrete progress made in building the four core capacities.
             '''
             
-            # Use the correct OpenAI client syntax
-            client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            # Pinned openai 0.28 has no OpenAI client class; go through the shared LLM client
+            return llm.chat(
+                "challenge.therapeutic_summary",
+                [
                     {"role": "system", "content": "You are an expert therapeutic supervisor specializing in internal challenge therapy, trauma-informed care, and resilience building. Provide clinical assessments that are both professionally rigorous and deeply compassionate."},
                     {"role": "user", "content": prompt}
                 ],
+                model="gpt-4o",
                 max_tokens=500,
                 temperature=0.6
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             return self._generate_fallback_summary()
 
@@ -1,4 +1,5 @@
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
@@ -7,13 +8,19 @@ from django.utils import timezone
 from .models import ChallengeSession
 from .challenge_logic import InternalChallengeTherapySystem, TherapyPhase
 from .serializers import ChallengeRequestSerializer, ChallengeResponseSerializer
-from subscriptions.models import UserSubscription
-from chatbot.models import UserChatCounter
-
-class ChallengeAPIView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
+from chatbot.metering import LIMIT_REACHED_MESSAGE, meter
+from subscriptions.permissions import HasCoachEntitlement
+from op_mental.concurrency import run_blocking
+from op_mental.pagination import KeysetPagination
+from op_mental.crisis import crisis_response, detect_crisis
+
+class ChallengeAPIView(AsyncAPIView):
+    # Async: the therapy system (and its OpenAI summary call) runs on the coach
+    # thread pool, so no ASGI worker waits on the LLM.
+    permission_classes = [IsAuthenticated, HasCoachEntitlement]
+    coach_name = "challenge"
+
+    async def post(self, request, *args, **kwargs):
         serializer = ChallengeRequestSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -23,9 +30,26 @@ class ChallengeAPIView(APIView):
         session_id = validated_data.get('session_id')
         user_message = validated_data.get('message')
 
+        # Crisis check before the therapy system runs: answer with safety resources
+        # right away, without charging the message or advancing the session.
+        crisis = await run_blocking(detect_crisis, user_message)
+        if crisis is not None:
+            session = await ChallengeSession.objects.filter(id=session_id, user=user).afirst() if session_id else None
+            if session_id and not session:
+                return Response({"detail": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({
+                "session_id": str(session.id) if session else None,
+                "is_session_complete": session.is_complete if session else False,
+                "response_type": "crisis",
+                "message": [crisis_response(crisis)],
+                "question": None,
+                "error_message": None,
+                "crisis": True
+            }, status=status.HTTP_200_OK)
+
         if not session_id:
             # New session: return welcome message and create session
-            session = ChallengeSession.objects.create(user=user, current_phase=TherapyPhase.IDENTIFICATION.name)
+            session = await ChallengeSession.objects.acreate(user=user, current_phase=TherapyPhase.IDENTIFICATION.name)
             
             welcome_message = {
                 "session_id": str(session.id),
@@ -48,20 +72,28 @@ class ChallengeAPIView(APIView):
             }
             
             session.conversation_history = [welcome_message]
-            session.save()
+            await session.asave()
             
             return Response(welcome_message, status=status.HTTP_200_OK)
             
             
 
         # Existing session
-        session = ChallengeSession.objects.filter(id=session_id, user=user).first()
+        session = await ChallengeSession.objects.filter(id=session_id, user=user).afirst()
         if not session:
             return Response({"detail": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
 
         if session.is_complete:
             return Response({"detail": "This session is complete."}, status=status.HTTP_400_BAD_REQUEST)
 
+        if not await meter.acharge(user, self.coach_name):
+            return Response({"detail": LIMIT_REACHED_MESSAGE}, status=status.HTTP_208_ALREADY_REPORTED)
+
+        response_data = await run_blocking(self._run_turn, session, user_message)
+        return Response(ChallengeResponseSerializer(response_data).data, status=status.HTTP_200_OK)
+
+    def _run_turn(self, session: ChallengeSession, user_message: str) -> dict:
+        # Advance the therapy system by one user message and persist the session.
         therapy_system = self._load_system_from_session(session)
 
         if len(session.conversation_history) == 1:
@@ -124,7 +156,7 @@ class ChallengeAPIView(APIView):
 
         session = self._update_session_from_system(session, therapy_system)
         
-        return Response(ChallengeResponseSerializer(response_data).data, status=status.HTTP_200_OK)
+        return response_data
 
     def _load_system_from_session(self, session: ChallengeSession) -> InternalChallengeTherapySystem:
         system = InternalChallengeTherapySystem()
@@ -191,7 +223,11 @@ class ChallengeAPIView(APIView):
 
 
 class ChallengeHistoryView(APIView):
-    """API view to fetch the conversation history of a specific challenge session."""
+    """
+    API view to fetch the conversation history of a specific challenge session,
+    one page at a time. The history is a JSON list on the session row, so pages
+    are by position in the list.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, session_id, *args, **kwargs):
@@ -209,7 +245,8 @@ class ChallengeHistoryView(APIView):
             if session.session_data.get('phase_summary') and history:
                 history[-1]['phase_summary'] = session.session_data['phase_summary']
             
-            return Response(history, status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
+            return paginator.get_paginated_response(paginator.paginate_sequence(history, request))
         except ChallengeSession.DoesNotExist:
             return Response({"detail": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
     
\ No newline at end of file
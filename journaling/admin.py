@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import JournalSession, JournalEntry
+from .models import JournalSession, JournalEntry, JournalingStats
 # Register your models here.
 @admin.register(JournalSession)
 class JournalSessionAdmin(admin.ModelAdmin):
@@ -16,4 +16,9 @@ class JournalSessionAdmin(admin.ModelAdmin):
 class JournalEntryAdmin(admin.ModelAdmin):
     list_display = ('id', 'session', 'author', 'message', 'timestamp')
     search_fields = ('session__id', 'author', 'message')
-    list_filter = ('author', 'timestamp')
\ No newline at end of file
+    list_filter = ('author', 'timestamp')
+
+@admin.register(JournalingStats)
+class JournalingStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_entries', 'current_streak', 'longest_streak', 'last_active_date', 'updated_at')
+    search_fields = ('user__username',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class JournalingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'journaling'
+
+    def ready(self):
+        import journaling.signals
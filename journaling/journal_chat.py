@@ -1,31 +1,98 @@
+import copy
 import random
 import os
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 import json
 import re
+import threading
+import time
 import openai
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+from django.conf import settings
+from knowledge_base.embeddings import encode, registry
 from knowledge_base.services import query_knowledge
+from op_mental import llm
+from op_mental.concurrency import run_concurrently
+from op_mental.keywords import KeywordMatcher
+from op_mental.prompt_budget import PromptBuilder, truncate_tokens
 
 load_dotenv()
 
-class Journal:
+# Token caps for the variable parts of the coach prompts: the user's text (the
+# whole session's answers for the summary), and the recent exchanges, of which
+# the newest JOURNAL_RECENT_EXCHANGES are kept whole as far as the cap allows.
+JOURNAL_INPUT_MAX_TOKENS = getattr(settings, "JOURNAL_INPUT_MAX_TOKENS", 1200)
+JOURNAL_HISTORY_MAX_TOKENS = getattr(settings, "JOURNAL_HISTORY_MAX_TOKENS", 400)
+JOURNAL_RECENT_EXCHANGES = getattr(settings, "JOURNAL_RECENT_EXCHANGES", 3)
+# Seconds the session summary waits for its insights and recommendations, generated concurrently
+JOURNAL_SUMMARY_TIMEOUT = getattr(settings, "JOURNAL_SUMMARY_TIMEOUT", 20)
+
+# Anchor texts each journal answer is compared against. They never change, so
+# they are encoded once per process and every turn needs a single model call.
+FUTURE_ANCHOR = "goals dreams vision future plans aspirations wants achieve"
+POSITIVE_ANCHOR = "great wonderful amazing excellent successful proud happy excited confident accomplished"
+NEGATIVE_ANCHOR = "difficult challenging frustrated stressed overwhelmed disappointed sad angry worried anxious"
+_anchor_embeddings = None
+_anchor_lock = threading.Lock()
+
+def anchor_embeddings() -> np.ndarray:
+    """Return the future, positive and negative anchor embeddings (rows in that order)."""
+    global _anchor_embeddings
+    if _anchor_embeddings is None:
+        with _anchor_lock:
+            if _anchor_embeddings is None:
+                _anchor_embeddings = encode([FUTURE_ANCHOR, POSITIVE_ANCHOR, NEGATIVE_ANCHOR]).embeddings
+    return _anchor_embeddings
+
+def analyze_response(response: str) -> Dict[str, str]:
+    """Sentiment and future focus of one answer, from one encode call against the anchors."""
+    response_embedding = encode([response]).embeddings[0]
+    future_similarity, pos_similarity, neg_similarity = anchor_embeddings() @ response_embedding
+
+    if pos_similarity > neg_similarity and pos_similarity > 0.2:
+        sentiment = "positive"
+    elif neg_similarity > pos_similarity and neg_similarity > 0.2:
+        sentiment = "negative"
+    else:
+        sentiment = "neutral"
+    return {"is_future_focused": str(future_similarity > 0.25), "sentiment": sentiment}
+
+# Question words that might indicate coaching relevance (matched as substrings), and
+# personal pronouns that suggest self-reflection (whole words, or "i" would match "this").
+COACHING_QUESTION_WORDS = ["how", "what", "why", "when", "where", "should", "could", "would"]
+PERSONAL_INDICATORS = ["i", "me", "my", "myself", "i'm", "i've", "i'll"]
+QUESTION_MATCHER = KeywordMatcher({"question": COACHING_QUESTION_WORDS})
+PERSONAL_MATCHER = KeywordMatcher({"personal": PERSONAL_INDICATORS}, whole_words=True)
+
+def new_session_state() -> Dict:
+    """The state of a journal session that has not started (kept in JournalSession.session_data)."""
+    return {
+        "entry_point": None,
+        "responses": {},
+        "current_layer": 1,
+        "current_phase": "start",
+        "session_start": None,
+        "is_future_focused": "False",
+        "sentiment": None,
+        "session_active": "False",
+        "conversation_history": [],
+        "questions_asked": []  # Track asked questions to avoid repetition
+    }
+
+class JournalKnowledge:
+    """
+    The journal coach's fixed knowledge: prompt tables, relevance keywords and
+    the evidence database with its FAISS index. It is built once per process
+    (see get_journal_knowledge()) and shared read-only by every Journal, so a
+    turn does not re-encode the evidence.
+    """
 
     def __init__(self):
-        # Initialize OpenAI for version 0.28.0
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        if not openai.api_key:
-            raise ValueError("Please set OPENAI_API_KEY in your .env file")
-        
-        # Initialize sentence transformer for embeddings
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Initialize FAISS index
-        self.dimension = 384  # Dimension of all-MiniLM-L6-v2 embeddings
+        # Initialize FAISS index (embeddings come from the shared model registry)
+        self.dimension = registry.dimension()
         self.index = faiss.IndexFlatIP(self.dimension)  # Inner product (cosine similarity)
         
         # Store evidence database for FAISS
@@ -42,6 +109,8 @@ class Journal:
             "life_challenges": ["problem", "difficulty", "struggle", "issue", "challenge", "conflict", "decision", "choice", "crisis", "setback", "failure"]
         }
         
+        self.domain_matcher = KeywordMatcher(self.coaching_domains)
+        
         # Entry points with AI-powered initial prompts
         self.entry_points = {
             "personal_challenge": "What has been going on in your personal life that I can help you explore? Take your time to share as much detail as you'd like about the situation.",
@@ -186,20 +255,6 @@ class Journal:
         
         # Initialize FAISS database
         self._initialize_evidence_database()
-        
-        # Session data storage
-        self.current_session = {
-            "entry_point": None,
-            "responses": {},
-            "current_layer": 1,
-            "current_phase": "start",
-            "session_start": None,
-            "is_future_focused": "False",
-            "sentiment": None,
-            "session_active": "False",
-            "conversation_history": [],
-            "questions_asked": []  # Track asked questions to avoid repetition
-        }
 
     def _initialize_evidence_database(self):
         """Initialize FAISS database with evidence-based sources."""
@@ -217,38 +272,99 @@ class Journal:
         
         # Generate embeddings
         texts = [entry["text"] for entry in self.evidence_database]
-        embeddings = self.encoder.encode(texts)
-        
         # Normalize embeddings for cosine similarity
-        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = encode(texts, normalize=True).embeddings
         
         # Add to FAISS index
-        self.index.add(embeddings.astype('float32')) # type: ignore
+        self.index.add(embeddings) # type: ignore
         self.evidence_embeddings = embeddings
         
         #print(f"Evidence database initialized with {len(self.evidence_database)} entries")
 
-    def _is_coaching_related(self, text: str) -> bool:
+    def is_coaching_related(self, text: str) -> bool:
         """Check if the input is related to life coaching domains."""
-        text_lower = text.lower()
-        
-        # Count matches across all domains
-        total_matches = 0
-        for domain, keywords in self.coaching_domains.items():
-            matches = sum(1 for keyword in keywords if keyword in text_lower)
-            total_matches += matches
-        
-        # Also check for question words that might indicate coaching relevance
-        coaching_question_words = ["how", "what", "why", "when", "where", "should", "could", "would"]
-        question_matches = sum(1 for word in coaching_question_words if word in text_lower)
-        
-        # Check for personal pronouns that suggest self-reflection
-        personal_indicators = ["i", "me", "my", "myself", "i'm", "i've", "i'll"]
-        personal_matches = sum(1 for word in personal_indicators if word in text_lower)
+        # One scan per keyword table (see op_mental/keywords.py)
+        total_matches = sum(self.domain_matcher.counts(text).values())
+        question_matches = QUESTION_MATCHER.counts(text)["question"]
+        personal_matches = PERSONAL_MATCHER.counts(text)["personal"]
         
         # Consider it coaching-related if we have domain keywords, questions, or personal references
         return total_matches > 0 or (question_matches > 0 and personal_matches > 0)
 
+    def get_relevant_evidence(self, query: str, top_k: int = 3) -> List[Dict]:
+        """Retrieve relevant evidence using FAISS similarity search."""
+        if not query.strip():
+            return []
+            
+        try:
+            # Encode query
+            query_embedding = encode([query], normalize=True).embeddings
+            
+            # Search FAISS index
+            scores, indices = self.index.search(query_embedding, top_k)
+            
+            results = []
+            for score, idx in zip(scores[0], indices[0]):
+                if idx < len(self.evidence_database) and score > 0.1:  # Minimum relevance threshold
+                    entry = self.evidence_database[idx].copy()
+                    entry["similarity_score"] = float(score)
+                    results.append(entry)
+            
+            return results
+        except Exception as e:
+            print(f"Error in evidence retrieval: {e}")
+            return []
+
+    def _reinitialize_faiss_index(self):
+        """Reinitialize FAISS index after adding new evidence."""
+        try:
+            # Create new index
+            self.index = faiss.IndexFlatIP(self.dimension)
+            
+            # Generate embeddings for all evidence
+            texts = [entry["text"] for entry in self.evidence_database]
+            # Normalize embeddings
+            embeddings = encode(texts, normalize=True).embeddings
+            
+            # Add to FAISS index
+            self.index.add(embeddings) # type: ignore
+            self.evidence_embeddings = embeddings
+            
+        except Exception as e:
+            print(f"Error reinitializing FAISS index: {e}")
+
+_journal_knowledge = None
+_journal_knowledge_lock = threading.Lock()
+
+def get_journal_knowledge() -> JournalKnowledge:
+    """The process-wide JournalKnowledge, built on first use."""
+    global _journal_knowledge
+    if _journal_knowledge is None:
+        with _journal_knowledge_lock:
+            if _journal_knowledge is None:
+                _journal_knowledge = JournalKnowledge()
+    return _journal_knowledge
+
+class Journal:
+    """
+    One journal coaching session: its state (current_session, loaded from and
+    saved to JournalSession.session_data) plus the shared JournalKnowledge.
+    Cheap to create, so the views make one per request.
+    """
+
+    def __init__(self, session_data: Optional[Dict] = None, knowledge: Optional[JournalKnowledge] = None):
+        # Initialize OpenAI for version 0.28.0
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        if not openai.api_key:
+            raise ValueError("Please set OPENAI_API_KEY in your .env file")
+
+        self.knowledge = knowledge if knowledge is not None else get_journal_knowledge()
+        # Session data storage
+        self.current_session = session_data if session_data else new_session_state()
+
+    def _is_coaching_related(self, text: str) -> bool:
+        return self.knowledge.is_coaching_related(text)
+
     def _handle_irrelevant_input(self, user_input: str) -> str:
         """Handle inputs that are not related to life coaching."""
         
@@ -270,31 +386,11 @@ class Journal:
         return random.choice(redirect_responses)
 
     def _get_relevant_evidence(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Retrieve relevant evidence using FAISS similarity search."""
-        if not query.strip():
-            return []
-            
-        try:
-            # Encode query
-            query_embedding = self.encoder.encode([query])
-            query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
-            
-            # Search FAISS index
-            scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
-            
-            results = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx < len(self.evidence_database) and score > 0.1:  # Minimum relevance threshold
-                    entry = self.evidence_database[idx].copy()
-                    entry["similarity_score"] = float(score)
-                    results.append(entry)
-            
-            return results
-        except Exception as e:
-            print(f"Error in evidence retrieval: {e}")
-            return []
+        return self.knowledge.get_relevant_evidence(query, top_k)
 
-    def _generate_ai_response(self, user_input: str, context: str, response_type: str) -> str:
+    def _generate_ai_response(self, user_input: str, context: str, response_type: str,
+                              timeout: Optional[float] = None) -> str:
+        user_input = truncate_tokens(user_input, JOURNAL_INPUT_MAX_TOKENS, "gpt-4o")
         
         # Get relevant evidence only from our curated sources
         evidence_query = f"{user_input} {context} {response_type}"
@@ -310,10 +406,15 @@ class Journal:
         # Create conversation history context
         history_context = ""
         if len(self.current_session["conversation_history"]) > 1:
-            recent_history = self.current_session["conversation_history"][-2:]
-            history_context = "\nRecent context:\n"
-            for exchange in recent_history:
-                history_context += f"User: {exchange['user'][:80]}...\nCoach: {exchange['coach'][:80]}...\n"
+            recent_history = self.current_session["conversation_history"][-JOURNAL_RECENT_EXCHANGES:]
+            history = PromptBuilder(JOURNAL_HISTORY_MAX_TOKENS, model="gpt-4o")
+            part_cap = JOURNAL_HISTORY_MAX_TOKENS // 4  # so the latest exchange always fits
+            history.add("recent_history", [
+                f"User: {truncate_tokens(exchange['user'], part_cap, 'gpt-4o')}\n"
+                f"Coach: {truncate_tokens(exchange['coach'], part_cap, 'gpt-4o')}"
+                for exchange in recent_history
+            ], header="\nRecent context:")
+            history_context = history.build()
         
         # Build prompt based on response type and current layer
         if response_type == "layer_exploration":
@@ -369,17 +470,17 @@ Provide encouraging, specific guidance for a more detailed response about life c
 Generate 2-3 specific, actionable insights that are encouraging and personalized, based solely on the evidence sources provided."""
 
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[
+            generated_response = llm.chat(
+                f"journal.{response_type}",
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
+                model="gpt-4o",
                 max_tokens=250,
-                temperature=0.7
-            )
-            
-            generated_response = response.choices[0].message.content.strip()
+                temperature=0.7,
+                timeout=timeout
+            ).strip()
             
             # Store the question/response pattern to avoid repetition
             if response_type == "layer_exploration":
@@ -417,7 +518,7 @@ Generate 2-3 specific, actionable insights that are encouraging and personalized
             self.current_session["conversation_history"] = []
             self.current_session["questions_asked"] = []
             
-            opening_message = self.entry_points[choice_map[choice]]
+            opening_message = self.knowledge.entry_points[choice_map[choice]]
             self._add_to_history("Selected option " + choice, opening_message)
             return opening_message
         else:
@@ -513,31 +614,7 @@ Generate 2-3 specific, actionable insights that are encouraging and personalized
     def _analyze_response(self, response: str) -> None:
         """Analyze response for sentiment and future focus using embeddings."""
         try:
-            response_embedding = self.encoder.encode([response])
-            
-            # Check for future orientation
-            future_indicators = "goals dreams vision future plans aspirations wants achieve"
-            future_embedding = self.encoder.encode([future_indicators])
-            future_similarity = np.dot(response_embedding, future_embedding.T)[0][0]
-            self.current_session["is_future_focused"] = str(future_similarity > 0.25)
-            
-            # Analyze sentiment
-            positive_words = "great wonderful amazing excellent successful proud happy excited confident accomplished"
-            negative_words = "difficult challenging frustrated stressed overwhelmed disappointed sad angry worried anxious"
-            
-            positive_embedding = self.encoder.encode([positive_words])
-            negative_embedding = self.encoder.encode([negative_words])
-            
-            pos_similarity = np.dot(response_embedding, positive_embedding.T)[0][0]
-            neg_similarity = np.dot(response_embedding, negative_embedding.T)[0][0]
-            
-            if pos_similarity > neg_similarity and pos_similarity > 0.2:
-                self.current_session["sentiment"] = "positive"
-            elif neg_similarity > pos_similarity and neg_similarity > 0.2:
-                self.current_session["sentiment"] = "negative"
-            else:
-                self.current_session["sentiment"] = "neutral"
-                
+            self.current_session.update(analyze_response(response))
         except Exception as e:
             print(f"Analysis error: {e}")
             self.current_session["sentiment"] = "neutral"
@@ -551,19 +628,29 @@ Generate 2-3 specific, actionable insights that are encouraging and personalized
         for layer_key, responses in self.current_session["responses"].items():
             all_responses += f"{layer_key}: " + " | ".join(responses) + "\n"
         
-        # Generate AI insights (using only our evidence sources)
-        ai_insights = self._generate_ai_response(
-            all_responses,
-            f"complete {self.current_session['entry_point'].replace('_', ' ')} coaching session",
-            "summary_insights"
-        )
-        
         # Get evidence-based recommendations from our curated sources only
         evidence_query = f"{self.current_session['entry_point']} {self.current_session['sentiment']} {all_responses[:300]}"
         relevant_evidence = self._get_relevant_evidence(evidence_query, top_k=4)
         
-        # Generate recommendations based only on our evidence sources
-        recommendations = self._generate_recommendations(relevant_evidence)
+        # The AI insights and the recommendations (both using only our evidence sources) are
+        # independent, so both LLM calls run at once; a part that fails or misses the
+        # deadline gets its fallback text without holding up the other.
+        deadline = time.monotonic() + JOURNAL_SUMMARY_TIMEOUT
+        ai_insights, recommendations = run_concurrently(
+            [
+                lambda: self._generate_ai_response(
+                    all_responses,
+                    f"complete {self.current_session['entry_point'].replace('_', ' ')} coaching session",
+                    "summary_insights",
+                    timeout=max(deadline - time.monotonic(), 0.1)
+                ),
+                lambda: self._generate_recommendations(
+                    relevant_evidence, timeout=max(deadline - time.monotonic(), 0.1)
+                ),
+            ],
+            fallbacks=[lambda: self._get_fallback_response("summary_insights"), self._fallback_recommendations],
+            timeout=JOURNAL_SUMMARY_TIMEOUT,
+        )
         
         # Create final summary
         summary = f"""
@@ -592,7 +679,7 @@ Session completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         self._reset_session()
         return summary.strip()
 
-    def _generate_recommendations(self, evidence: List[Dict]) -> str:
+    def _generate_recommendations(self, evidence: List[Dict], timeout: Optional[float] = None) -> str:
         """Generate actionable recommendations based only on our evidence sources."""
         try:
             evidence_text = ""
@@ -614,17 +701,17 @@ Session completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 Create specific, actionable recommendations. Be practical and encouraging. Base recommendations ONLY on the evidence provided from these trusted sources."""
 
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[
+            return llm.chat(
+                "journal.recommendations",
+                [
                     {"role": "system", "content": "Generate specific, actionable recommendations based ONLY on the evidence provided from our trusted research sources. Do not reference any external information."},
                     {"role": "user", "content": prompt}
                 ],
+                model="gpt-4o",
                 max_tokens=200,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
+                temperature=0.7,
+                timeout=timeout
+            ).strip()
             
         except Exception as e:
             print(f"Recommendations error: {e}")
@@ -656,18 +743,7 @@ Create specific, actionable recommendations. Be practical and encouraging. Base
 
     def _reset_session(self) -> Dict:
         """Reset session data for next use."""
-        self.current_session = {
-            "entry_point": None,
-            "responses": {},
-            "current_layer": 1,
-            "current_phase": "start",
-            "session_start": None,
-            "is_future_focused": "False",
-            "sentiment": None,
-            "session_active": "False",
-            "conversation_history": [],
-            "questions_asked": []
-        }
+        self.current_session = new_session_state()
         return self.current_session
 
     def get_session_data(self) -> Dict:
@@ -677,11 +753,11 @@ Create specific, actionable recommendations. Be practical and encouraging. Base
     def get_evidence_stats(self) -> Dict:
         """Get evidence database statistics."""
         return {
-            "total_evidence_entries": len(self.evidence_database),
-            "categories": list(set([entry["category"] for entry in self.evidence_database])),
-            "sources": list(set([entry["source"] for entry in self.evidence_database])),
-            "faiss_index_size": self.index.ntotal,
-            "coaching_domains": list(self.coaching_domains.keys())
+            "total_evidence_entries": len(self.knowledge.evidence_database),
+            "categories": list(set([entry["category"] for entry in self.knowledge.evidence_database])),
+            "sources": list(set([entry["source"] for entry in self.knowledge.evidence_database])),
+            "faiss_index_size": self.knowledge.index.ntotal,
+            "coaching_domains": list(self.knowledge.coaching_domains.keys())
         }
 
     def export_session_data(self, filepath: str = None) -> str:
@@ -712,13 +788,18 @@ Create specific, actionable recommendations. Be practical and encouraging. Base
             return f"Error exporting session data: {e}"
 
     def load_custom_evidence(self, custom_sources: Dict) -> str:
-        """Load additional evidence sources while maintaining domain focus."""
+        """
+        Load additional evidence sources while maintaining domain focus. They
+        only apply to this Journal: it gets its own copy of the knowledge.
+        """
         try:
-            initial_count = len(self.evidence_database)
+            knowledge = copy.copy(self.knowledge)
+            knowledge.evidence_database = list(self.knowledge.evidence_database)
+            initial_count = len(knowledge.evidence_database)
             
             for category, data in custom_sources.items():
                 # Validate that custom sources are coaching-related
-                if not any(keyword in category.lower() for domain_keywords in self.coaching_domains.values() for keyword in domain_keywords):
+                if not any(keyword in category.lower() for domain_keywords in knowledge.coaching_domains.values() for keyword in domain_keywords):
                     print(f"Skipping non-coaching category: {category}")
                     continue
                 
@@ -729,38 +810,19 @@ Create specific, actionable recommendations. Be practical and encouraging. Base
                         "category": category,
                         "keywords": data.get("keywords", [])
                     }
-                    self.evidence_database.append(entry)
+                    knowledge.evidence_database.append(entry)
             
             # Reinitialize FAISS index with new data
-            if len(self.evidence_database) > initial_count:
-                self._reinitialize_faiss_index()
-                return f"Added {len(self.evidence_database) - initial_count} new evidence entries"
+            if len(knowledge.evidence_database) > initial_count:
+                knowledge._reinitialize_faiss_index()
+                self.knowledge = knowledge
+                return f"Added {len(knowledge.evidence_database) - initial_count} new evidence entries"
             else:
                 return "No coaching-related evidence was added"
                 
         except Exception as e:
             return f"Error loading custom evidence: {e}"
 
-    def _reinitialize_faiss_index(self):
-        """Reinitialize FAISS index after adding new evidence."""
-        try:
-            # Create new index
-            self.index = faiss.IndexFlatIP(self.dimension)
-            
-            # Generate embeddings for all evidence
-            texts = [entry["text"] for entry in self.evidence_database]
-            embeddings = self.encoder.encode(texts)
-            
-            # Normalize embeddings
-            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-            
-            # Add to FAISS index
-            self.index.add(embeddings.astype('float32')) # type: ignore
-            self.evidence_embeddings = embeddings
-            
-        except Exception as e:
-            print(f"Error reinitializing FAISS index: {e}")
-
     def get_coaching_tips(self) -> List[str]:
         """Get general coaching tips based on evidence sources."""
         tips = [
@@ -779,8 +841,8 @@ Create specific, actionable recommendations. Be practical and encouraging. Base
             "entry_point_selected": self.current_session["entry_point"] is not None,
             "responses_recorded": len(self.current_session["responses"]) > 0,
             "conversation_history": len(self.current_session["conversation_history"]) > 0,
-            "evidence_database_loaded": len(self.evidence_database) > 0,
-            "faiss_index_ready": self.index.ntotal > 0
+            "evidence_database_loaded": len(self.knowledge.evidence_database) > 0,
+            "faiss_index_ready": self.knowledge.index.ntotal > 0
         }
         return checks
 
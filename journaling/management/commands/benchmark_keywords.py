@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.management.commands.benchmark_crisis import MESSAGES as CRISIS_MESSAGES
+from internal_challenge.challenge_logic import CHALLENGE_KEYWORDS, CHALLENGE_MATCHER, ChallengeType
+from journaling.journal_chat import COACHING_QUESTION_WORDS, PERSONAL_INDICATORS, get_journal_knowledge
+
+MESSAGES = CRISIS_MESSAGES + [
+    "I keep procrastinating on my thesis and feel like a fraud next to my labmates.",
+    "Ever since the accident I get flashbacks whenever I drive.",
+    "Who am I without running? My whole identity was being an athlete.",
+    "Show me the weather for this weekend.",
+    # A long journal entry
+    " ".join(CRISIS_MESSAGES[:3] + CRISIS_MESSAGES[8:]) * 4,
+]
+
+
+def substring_is_coaching_related(coaching_domains, text: str) -> bool:
+    # The previous implementations: one substring search per keyword.
+    text_lower = text.lower()
+    total_matches = 0
+    for keywords in coaching_domains.values():
+        total_matches += sum(1 for keyword in keywords if keyword in text_lower)
+    question_matches = sum(1 for word in COACHING_QUESTION_WORDS if word in text_lower)
+    personal_matches = sum(1 for word in PERSONAL_INDICATORS if word in text_lower)
+    return total_matches > 0 or (question_matches > 0 and personal_matches > 0)
+
+
+def substring_challenge_type(text: str) -> ChallengeType:
+    message_lower = text.lower()
+    for challenge_type, keywords in CHALLENGE_KEYWORDS.items():
+        if any(keyword in message_lower for keyword in keywords):
+            return challenge_type
+    return ChallengeType.GENERAL
+
+
+class Command(BaseCommand):
+    help = "Per-message cost of the coaches' keyword checks: substring loops against the compiled matchers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=200, help="Times each message is checked.")
+
+    def _time(self, fn, rounds, messages):
+        timings = []
+        for _ in range(rounds):
+            for message in messages:
+                start = time.perf_counter()
+                fn(message)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def handle(self, *args, **options):
+        knowledge = get_journal_knowledge()
+        checks = [
+            ("journal relevance", lambda text: substring_is_coaching_related(knowledge.coaching_domains, text),
+             knowledge.is_coaching_related),
+            ("challenge type", substring_challenge_type,
+             lambda text: CHALLENGE_MATCHER.first(text) or ChallengeType.GENERAL),
+        ]
+
+        # The matchers keep substring semantics, except that the journal's pronouns match
+        # as whole words ("i" no longer hits "this"), so only journal verdicts may differ.
+        for name, before, after in checks:
+            for message in MESSAGES:
+                old, new = before(message), after(message)
+                if old != new:
+                    self.stdout.write(f"{name}: {old} -> {new}  {message[:60]}")
+
+        self.stdout.write(f"\n{'check':<32}{'loops p50 ms':>14}{'matcher p50 ms':>16}{'speedup':>10}")
+        for name, before, after in checks:
+            for label, messages in (("", MESSAGES[:-1]), (" (long entry)", MESSAGES[-1:])):
+                old_p50, _ = self._time(before, options["rounds"], messages)
+                new_p50, _ = self._time(after, options["rounds"], messages)
+                self.stdout.write(f"{name + label:<32}{old_p50:>14.4f}{new_p50:>16.4f}{old_p50 / new_p50:>9.1f}x")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journaling', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='journal_entry_session_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='journalsession',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='journal_session_user_keyset'),
+        ),
+    ]
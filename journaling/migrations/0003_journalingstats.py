@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journaling', '0002_history_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalingStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='journaling_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('category_counts', models.JSONField(default=dict)),
+                ('total_entries', models.PositiveIntegerField(default=0)),
+                ('daily_counts', models.JSONField(default=dict)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('last_active_date', models.DateField(blank=True, null=True)),
+                ('rebuilt_through_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -19,6 +19,12 @@ class JournalSession(models.Model):
     def __str__(self):
         return f"Journal session by {self.user} on {self.created_at.strftime('%Y-%m-%d')}"
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's sessions (see op_mental/pagination.py)
+            models.Index(fields=['user', 'created_at', 'id'], name='journal_session_user_keyset'),
+        ]
+
 class JournalEntry(models.Model):
     session = models.ForeignKey(JournalSession, related_name='entries', on_delete=models.CASCADE)
     author = models.CharField(max_length=10) # 'user' or 'bot'
@@ -26,4 +32,33 @@ class JournalEntry(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.author}: {self.message[:50]}"
\ No newline at end of file
+        return f"{self.author}: {self.message[:50]}"
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a session's entries (see op_mental/pagination.py)
+            models.Index(fields=['session', 'timestamp', 'id'], name='journal_entry_session_keyset'),
+        ]
+
+class JournalingStats(models.Model):
+    """
+    A user's journaling statistics, updated as their sessions are created so the
+    statistics endpoint reads one row (see journaling/stats.py). Deleting a
+    session drops the row; it is rebuilt from the sessions on the next read.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='journaling_stats')
+    category_counts = models.JSONField(default=dict)
+    total_entries = models.PositiveIntegerField(default=0)
+    # Sessions per day ("YYYY-MM-DD" -> count) over the last JOURNAL_STATS_HISTORY_DAYS days
+    daily_counts = models.JSONField(default=dict)
+    # Consecutive days with a session, ending at last_active_date
+    current_streak = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_active_date = models.DateField(null=True, blank=True)
+    # Highest session id the last rebuild counted (see journaling/stats.py)
+    rebuilt_through_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Journaling stats for {self.user}"
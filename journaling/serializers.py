@@ -14,13 +14,27 @@ class JournalSessionSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'category', 'summary', 'created_at', 'Entries')
         read_only_fields = ('user',)
 
+class JournalSessionDetailSerializer(serializers.ModelSerializer):
+    # JournalSessionSerializer without the entries, which the detail view pages separately.
+    class Meta:
+        model = JournalSession
+        fields = ('id', 'user', 'category', 'summary', 'created_at')
+        read_only_fields = ('user',)
+
 class JournalSessionListSerializer(serializers.ModelSerializer):
     class Meta:
         model = JournalSession
         fields = ('id', 'category', 'created_at')
 
+class DailyActivitySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    count = serializers.IntegerField()
+
 class JournalingStatisticsSerializer(serializers.Serializer):
     category_counts = serializers.DictField(child=serializers.IntegerField())
     total_entries = serializers.IntegerField()
     this_month_entries = serializers.IntegerField()
-    last_week_entries = serializers.IntegerField()
\ No newline at end of file
+    last_week_entries = serializers.IntegerField()
+    current_streak = serializers.IntegerField()
+    longest_streak = serializers.IntegerField()
+    daily_activity = DailyActivitySerializer(many=True)
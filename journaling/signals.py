@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import JournalSession
+from .stats import invalidate_stats, record_session
+
+@receiver(post_save, sender=JournalSession)
+def journal_session_saved(sender, instance, created, **kwargs):
+    """Counts a new session in its user's journaling statistics."""
+    if created:
+        record_session(instance)
+
+@receiver(post_delete, sender=JournalSession)
+def journal_session_deleted(sender, instance, **kwargs):
+    """Drops the user's journaling statistics; the next read rebuilds them."""
+    invalidate_stats(instance.user_id)
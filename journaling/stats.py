@@ -0,0 +1,154 @@
+"""
+Journaling statistics.
+
+Each user's statistics are kept in one JournalingStats row, so the statistics
+endpoint costs a primary-key read. Creating a session updates the row in
+place (see journaling/signals.py): the category and total counters, the
+per-day histogram and the streaks. Deleting a session drops the row, and the
+next read rebuilds it from the sessions with two queries (one
+conditional-aggregate count per category, and one count per day). Sessions
+written with bulk queries, which send no signals, are only picked up by a
+rebuild.
+
+Rebuilds and updates of one user's row take a lock on the user's row, so a
+session created during a rebuild is counted exactly once. A session whose id
+is above the row's rebuilt_through_id cannot have been counted by the rebuild
+and is added to the row; one at or below it may have been, so the row is
+rebuilt again instead (rare: only when a rebuild ran between the session's
+insert and its update).
+
+Days are local dates (TIME_ZONE). "This month" and "last week" are the last 30
+and 7 days including today, counted from the histogram.
+"""
+from datetime import date, timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import JournalingStats, JournalSession
+
+JOURNAL_STATS_HISTORY_DAYS = getattr(settings, "JOURNAL_STATS_HISTORY_DAYS", 365)
+JOURNAL_STATS_MAX_ACTIVITY_DAYS = getattr(settings, "JOURNAL_STATS_MAX_ACTIVITY_DAYS", 365)
+CATEGORIES = [category for category, _ in JournalSession.CATEGORY_CHOICES]
+
+
+def session_counts(user) -> Dict[str, int]:
+    """
+    The user's session count per category and in total, and the highest session
+    id counted ('last_id'), in one conditional-aggregate query.
+    """
+    aggregates = {category: Count('id', filter=Q(category=category)) for category in CATEGORIES}
+    aggregates['total'] = Count('id')
+    aggregates['last_id'] = Max('id')
+    return JournalSession.objects.filter(user=user).aggregate(**aggregates)
+
+
+def _lock_user(user_id) -> None:
+    # Serializes rebuilds and updates of one user's statistics (call inside a transaction).
+    list(get_user_model().objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+
+
+def _streaks(days: List[date]):
+    # (current, longest) runs of consecutive days in a sorted list; current ends at the last day.
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest
+
+
+def _prune(daily_counts: Dict[str, int], today: date) -> Dict[str, int]:
+    first = (today - timedelta(days=JOURNAL_STATS_HISTORY_DAYS - 1)).isoformat()
+    return {day: count for day, count in daily_counts.items() if day >= first}
+
+
+def rebuild_stats(user) -> JournalingStats:
+    """Recompute the user's statistics row from their sessions."""
+    with transaction.atomic():
+        _lock_user(user.pk)
+        return _rebuild_locked(user.pk)
+
+
+def _rebuild_locked(user_id) -> JournalingStats:
+    counts = session_counts(user_id)
+    per_day = list(
+        JournalSession.objects.filter(user=user_id)
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day').annotate(count=Count('id')).order_by('day')
+    )
+    days = [row['day'] for row in per_day]
+    current, longest = _streaks(days)
+    stats, _ = JournalingStats.objects.update_or_create(user_id=user_id, defaults={
+        'category_counts': {category: counts[category] for category in CATEGORIES},
+        'total_entries': counts['total'],
+        'daily_counts': _prune({row['day'].isoformat(): row['count'] for row in per_day}, timezone.localdate()),
+        'current_streak': current,
+        'longest_streak': longest,
+        'last_active_date': days[-1] if days else None,
+        'rebuilt_through_id': counts['last_id'] or 0,
+    })
+    return stats
+
+
+def record_session(session: JournalSession) -> None:
+    """Count a newly created session in its user's statistics row (building the row if missing)."""
+    day = timezone.localdate(session.created_at)
+    with transaction.atomic():
+        _lock_user(session.user_id)
+        stats = JournalingStats.objects.filter(pk=session.user_id).first()
+        if stats is None or session.id <= stats.rebuilt_through_id:
+            _rebuild_locked(session.user_id)  # counts this session
+            return
+        stats.category_counts[session.category] = stats.category_counts.get(session.category, 0) + 1
+        stats.total_entries += 1
+        key = day.isoformat()
+        stats.daily_counts[key] = stats.daily_counts.get(key, 0) + 1
+        stats.daily_counts = _prune(stats.daily_counts, max(day, timezone.localdate()))
+        if stats.last_active_date is None or day > stats.last_active_date:
+            if stats.last_active_date == day - timedelta(days=1):
+                stats.current_streak += 1
+            else:
+                stats.current_streak = 1
+            stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+            stats.last_active_date = day
+        stats.save()
+
+
+def invalidate_stats(user_id) -> None:
+    JournalingStats.objects.filter(pk=user_id).delete()
+
+
+def get_stats(user) -> JournalingStats:
+    stats = JournalingStats.objects.filter(pk=user.pk).first()
+    return stats if stats is not None else rebuild_stats(user)
+
+
+def summarize(stats: JournalingStats, days: int = 30) -> Dict:
+    """The statistics endpoint's payload, with the last ``days`` days of activity."""
+    today = timezone.localdate()
+
+    def since(first_day: date) -> int:
+        first = first_day.isoformat()
+        return sum(count for day, count in stats.daily_counts.items() if day >= first)
+
+    # A streak is current until a whole day passes without a session.
+    streak_alive = stats.last_active_date is not None and stats.last_active_date >= today - timedelta(days=1)
+    activity = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    return {
+        'category_counts': {category: stats.category_counts.get(category, 0) for category in CATEGORIES},
+        'total_entries': stats.total_entries,
+        'this_month_entries': since(today - timedelta(days=29)),
+        'last_week_entries': since(today - timedelta(days=6)),
+        'current_streak': stats.current_streak if streak_alive else 0,
+        'longest_streak': stats.longest_streak,
+        'daily_activity': [
+            {'date': day, 'count': stats.daily_counts.get(day.isoformat(), 0)} for day in activity
+        ],
+    }
@@ -1,12 +1,22 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from adrf.views import APIView as AsyncAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import JournalSession, JournalEntry
-from .serializers import JournalSessionSerializer, JournalSessionListSerializer, JournalingStatisticsSerializer
+from .serializers import (
+    JournalEntrySerializer, JournalSessionDetailSerializer, JournalSessionSerializer,
+    JournalSessionListSerializer, JournalingStatisticsSerializer,
+)
 from .journal_chat import Journal as JournalChat
-from django.utils import timezone
-from datetime import timedelta, datetime
+from .stats import JOURNAL_STATS_MAX_ACTIVITY_DAYS, get_stats, summarize
+from subscriptions.permissions import HasCoachEntitlement
+from op_mental.concurrency import run_blocking
+from op_mental.pagination import KeysetPagination
+from op_mental.crisis import crisis_response, detect_crisis
+from chatbot.metering import LIMIT_REACHED_MESSAGE, meter
+from datetime import datetime
 
 # class JournalingChatView(APIView):
 #     permission_classes = [IsAuthenticated]
@@ -73,49 +83,70 @@ from datetime import timedelta, datetime
 
 #             return Response({'reply': response_message, 'session_id': session_id})
 
-class JournalingChatView(APIView):
-    permission_classes = [IsAuthenticated]
+class JournalingChatView(AsyncAPIView):
+    # Async: the journal coach (embeddings + OpenAI calls) runs on the coach
+    # thread pool and the ORM is awaited, so no ASGI worker waits on the LLM.
+    permission_classes = [IsAuthenticated, HasCoachEntitlement]
+    coach_name = "journal"
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         user_message = request.data.get('message', '') or ''
         session_id = request.data.get('session_id')
         user = request.user
 
+        # Crisis check before the coach runs, on every message including a session's
+        # first: answer with safety resources right away and leave the session state
+        # where it was (no session is started for a crisis first message).
+        crisis = await run_blocking(detect_crisis, user_message)
+
         if not session_id:
+            if crisis is not None:
+                return Response({'reply': crisis_response(crisis), 'session_id': None, 'crisis': True})
+
             # Start a new session
-            journal_chat = JournalChat()
-            response_message = journal_chat.start_system(user_message, is_initial_choice=True)
+            journal_chat = await run_blocking(JournalChat)
+            response_message = await run_blocking(journal_chat.start_system, user_message, is_initial_choice=True)
             
-            session = JournalSession.objects.create(
+            session = await JournalSession.objects.acreate(
                 user=user,
                 category=journal_chat.current_session['entry_point'],
                 session_data=journal_chat.current_session  # Save the full session state
             )
             
             # Create entries
-            JournalEntry.objects.create(session=session, author='user', message=user_message)
-            JournalEntry.objects.create(session=session, author='bot', message=response_message)
+            await JournalEntry.objects.acreate(session=session, author='user', message=user_message)
+            await JournalEntry.objects.acreate(session=session, author='bot', message=response_message)
             
             return Response({'reply': response_message, 'session_id': session.id})
         
         else:
             try:
                 # Get existing session
-                session = JournalSession.objects.get(id=session_id, user=user)
+                session = await JournalSession.objects.aget(id=session_id, user=user)
+                
+                if crisis is not None:
+                    response_message = crisis_response(crisis)
+                    await JournalEntry.objects.acreate(session=session, author='user', message=user_message)
+                    await JournalEntry.objects.acreate(session=session, author='bot', message=response_message)
+                    return Response({'reply': response_message, 'session_id': session.id, 'crisis': True})
+
+                if not await meter.acharge(user, self.coach_name):
+                    return Response({'reply': LIMIT_REACHED_MESSAGE, 'session_id': session.id},
+                                    status=status.HTTP_208_ALREADY_REPORTED)
                 
-                # Initialize Journal with saved session state
-                journal_chat = JournalChat()
-                if session.session_data:  # Load saved session state
-                    journal_chat.current_session = session.session_data
+                # Initialize Journal with saved session state (the evidence index is
+                # shared by the process; only the first request builds it)
+                journal_chat = await run_blocking(JournalChat, session.session_data)
+                if session.session_data:
                     journal_chat.current_session["session_active"] = "True"
                     journal_chat.current_session["current_phase"] = "exploration"
                 
                 # Process the message
-                response_message = journal_chat.start_system(user_message)
+                response_message = await run_blocking(journal_chat.start_system, user_message)
                 
                 # Save entries
-                JournalEntry.objects.create(session=session, author='user', message=user_message)
-                JournalEntry.objects.create(session=session, author='bot', message=response_message)
+                await JournalEntry.objects.acreate(session=session, author='user', message=user_message)
+                await JournalEntry.objects.acreate(session=session, author='bot', message=response_message)
                 
                 # Update session data
                 if "AI LIFE COACH SESSION SUMMARY" in response_message:
@@ -124,7 +155,7 @@ class JournalingChatView(APIView):
                 else:
                     session.session_data = journal_chat.current_session
                 
-                session.save()
+                await session.asave()
                 
                 return Response({'reply': response_message, 'session_id': session.id})
                 
@@ -134,6 +165,8 @@ class JournalingChatView(APIView):
 class JournalSessionListView(generics.ListAPIView):
     serializer_class = JournalSessionListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_descending = True
 
     def get_queryset(self):
         return JournalSession.objects.filter(user=self.request.user).order_by('-created_at')
@@ -141,35 +174,34 @@ class JournalSessionListView(generics.ListAPIView):
 class JournalSessionDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = JournalSessionSerializer
     permission_classes = [IsAuthenticated]
+    keyset_field = 'timestamp'
 
     def get_queryset(self):
         return JournalSession.objects.filter(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        # The session's fields, with one keyset page of its entries in "Entries"
+        # and the link to the next page in "next".
+        session = self.get_object()
+        paginator = KeysetPagination()
+        entries = paginator.paginate_queryset(session.entries.all(), request, view=self)
+        data = JournalSessionDetailSerializer(session).data
+        data['Entries'] = JournalEntrySerializer(entries, many=True).data
+        data['next'] = paginator.get_next_link()
+        return Response(data)
+
 class JournalingStatisticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-        
-        # Category counts
-        category_counts = {
-            'personal_win': JournalSession.objects.filter(user=user, category='personal_win').count(),
-            'personal_challenge': JournalSession.objects.filter(user=user, category='personal_challenge').count(),
-            'professional_win': JournalSession.objects.filter(user=user, category='professional_win').count(),
-            'professional_challenge': JournalSession.objects.filter(user=user, category='professional_challenge').count(),
-        }
-
-        # Entry counts
-        total_entries = JournalSession.objects.filter(user=user).count()
-        this_month_entries = JournalSession.objects.filter(user=user, created_at__gte=timezone.now() - timedelta(days=30)).count()
-        last_week_entries = JournalSession.objects.filter(user=user, created_at__gte=timezone.now() - timedelta(days=7)).count()
-
-        data = {
-            'category_counts': category_counts,
-            'total_entries': total_entries,
-            'this_month_entries': this_month_entries,
-            'last_week_entries': last_week_entries,
-        }
-
+        # One primary-key read of the user's materialized statistics (see journaling/stats.py);
+        # ?days= sets how many days of daily_activity to return.
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            raise ValidationError({'days': 'Expected an integer.'})
+        days = min(max(days, 1), JOURNAL_STATS_MAX_ACTIVITY_DAYS)
+
+        data = summarize(get_stats(request.user), days)
         serializer = JournalingStatisticsSerializer(data)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
@@ -7,3 +7,9 @@ class KnowledgeBaseConfig(AppConfig):
 
     def ready(self):
         import knowledge_base.signals
+        from django.conf import settings
+        from knowledge_base.embeddings import batcher
+        batcher.configure(
+            max_batch_size=getattr(settings, "KNOWLEDGE_EMBED_MAX_BATCH_SIZE", 64),
+            max_wait=getattr(settings, "KNOWLEDGE_EMBED_MAX_WAIT_MS", 5) / 1000,
+        )
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ("texts", "done", "embeddings", "model_loaded_now", "error")
+
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings: Optional[np.ndarray] = None
+        self.model_loaded_now = False
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Coalesce encode calls from concurrent threads into batched model calls.
+
+    A daemon worker thread per model takes the first waiting request, then keeps
+    collecting requests for up to ``max_wait`` seconds or until
+    ``max_batch_size`` texts are queued, encodes them in one ``model.encode``
+    call and hands each caller its own rows. Calls that are already a full
+    batch skip the queue, and ``max_wait <= 0`` disables batching entirely.
+    """
+
+    def __init__(self, registry, max_batch_size: int = 64, max_wait: float = 0.005) -> None:
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_batch_size: int = None, max_wait: float = None) -> None:
+        if max_batch_size is not None:
+            self.max_batch_size = max_batch_size
+        if max_wait is not None:
+            self.max_wait = max_wait
+
+    def _queue_for(self, model_name: str) -> "queue.Queue":
+        requests = self._queues.get(model_name)
+        if requests is not None:
+            return requests
+        with self._lock:
+            requests = self._queues.get(model_name)
+            if requests is None:
+                requests = queue.Queue()
+                worker = threading.Thread(
+                    target=self._run, args=(model_name, requests),
+                    name=f"embedding-batcher-{model_name}", daemon=True,
+                )
+                worker.start()
+                self._queues[model_name] = requests
+        return requests
+
+    def encode(self, texts: List[str], model_name: str):
+        """Return (embeddings, model_loaded_now) for texts, batched with other callers."""
+        if not texts or self.max_wait <= 0 or len(texts) >= self.max_batch_size:
+            result = self.registry.encode(texts, model_name=model_name)
+            return result.embeddings, result.model_loaded_now
+
+        request = _Request(list(texts))
+        self._queue_for(model_name).put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.embeddings, request.model_loaded_now
+
+    def _run(self, model_name: str, requests: "queue.Queue") -> None:
+        while True:
+            batch = [requests.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._encode_batch(model_name, batch)
+
+    def _encode_batch(self, model_name: str, batch: List[_Request]) -> None:
+        try:
+            texts = [text for request in batch for text in request.texts]
+            result = self.registry.encode(texts, model_name=model_name)
+            start = 0
+            for request in batch:
+                end = start + len(request.texts)
+                request.embeddings = result.embeddings[start:end]
+                request.model_loaded_now = result.model_loaded_now
+                start = end
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
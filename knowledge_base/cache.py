@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded LRU cache with an optional time-to-live.
+
+    Entries older than ``ttl`` seconds are treated as misses and dropped when
+    read; with ``refresh_on_get`` a hit restarts the entry's ttl, so it becomes
+    an idle timeout. ``hits``, ``misses`` and ``evictions`` count since
+    creation or the last ``clear()``.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, refresh_on_get: bool = False) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.refresh_on_get = refresh_on_get
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            if self.refresh_on_get:
+                self._entries[key] = (entry[0], time.monotonic())
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,72 @@
+import codecs
+from typing import BinaryIO, Iterator, NamedTuple
+
+# Boundaries tried, in order of preference, when choosing where a chunk ends.
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+class Chunk(NamedTuple):
+    """A slice of a document; start/end are character offsets into the decoded text."""
+    text: str
+    start: int
+    end: int
+
+
+def _split_point(buffer: str, chunk_size: int) -> int:
+    # End the chunk on the most natural boundary in its last 40%.
+    window_start = int(chunk_size * 0.6)
+    for separator in _SEPARATORS:
+        position = buffer.rfind(separator, window_start, chunk_size)
+        if position != -1:
+            return position + len(separator)
+    return chunk_size
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = 800, overlap: int = 150,
+                read_size: int = 64 * 1024, encoding: str = "utf-8") -> Iterator[Chunk]:
+    """
+    Split a binary file into overlapping text chunks without reading it whole.
+
+    The stream is read ``read_size`` bytes at a time and decoded incrementally,
+    so memory stays bounded by roughly ``read_size + chunk_size`` characters no
+    matter how large the file is.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    offset = 0  # character offset of buffer[0] in the document
+    eof = False
+
+    while True:
+        while not eof and len(buffer) < chunk_size:
+            data = stream.read(read_size)
+            if data:
+                buffer += decoder.decode(data)
+            else:
+                buffer += decoder.decode(b"", final=True)
+                eof = True
+
+        if not buffer.strip():
+            if eof:
+                return
+            # A long run of blank padding (e.g. from PDF extraction): skip it and read on.
+            offset += len(buffer)
+            buffer = ""
+            continue
+        if eof and len(buffer) <= chunk_size:
+            yield Chunk(buffer, offset, offset + len(buffer))
+            return
+
+        end = _split_point(buffer, chunk_size)
+        if buffer[:end].strip():  # blank chunks are not worth embedding
+            yield Chunk(buffer[:end], offset, offset + end)
+
+        # Start the next chunk `overlap` characters back, on a word boundary.
+        step = max(end - overlap, 1)
+        space = buffer.find(" ", step, end)
+        if space != -1:
+            step = space + 1
+        buffer = buffer[step:]
+        offset += step
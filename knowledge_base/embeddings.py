@@ -0,0 +1,79 @@
+import threading
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from .batching import MicroBatcher
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class EncodeResult(NamedTuple):
+    """Embeddings for a batch of texts plus whether this call paid the model load."""
+    embeddings: np.ndarray
+    model_loaded_now: bool
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry of SentenceTransformer models.
+
+    Models are loaded lazily on first use and shared by every caller in the
+    process (RAG pipeline, chat memory, journal coach, Streamlit console), so a
+    request never constructs its own copy of the model.
+    """
+
+    def __init__(self) -> None:
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def is_loaded(self, model_name: str = DEFAULT_MODEL_NAME) -> bool:
+        return model_name in self._models
+
+    def get_model(self, model_name: str = DEFAULT_MODEL_NAME):
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have finished loading while we waited.
+            model = self._models.get(model_name)
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+                self._models[model_name] = model
+        return model
+
+    def dimension(self, model_name: str = DEFAULT_MODEL_NAME) -> int:
+        return self.get_model(model_name).get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], model_name: str = DEFAULT_MODEL_NAME, normalize: bool = False) -> EncodeResult:
+        """Encode texts with the shared model, loading it first if needed."""
+        loaded_now = not self.is_loaded(model_name)
+        model = self.get_model(model_name)
+        embeddings = model.encode(texts, convert_to_numpy=True)
+        if normalize:
+            embeddings = _normalize(embeddings)
+        return EncodeResult(embeddings.astype("float32"), loaded_now)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+registry = EmbeddingModelRegistry()
+# Request-path encodes go through the batcher; KnowledgeBaseConfig.ready() applies
+# the KNOWLEDGE_EMBED_MAX_BATCH_SIZE / KNOWLEDGE_EMBED_MAX_WAIT_MS settings.
+batcher = MicroBatcher(registry)
+
+
+def get_model(model_name: str = DEFAULT_MODEL_NAME):
+    return registry.get_model(model_name)
+
+
+def encode(texts: List[str], model_name: str = DEFAULT_MODEL_NAME, normalize: bool = False) -> EncodeResult:
+    """Encode texts with the shared model, batched with concurrent callers."""
+    embeddings, loaded_now = batcher.encode(texts, model_name)
+    if normalize:
+        embeddings = _normalize(embeddings)
+    return EncodeResult(embeddings.astype("float32"), loaded_now)
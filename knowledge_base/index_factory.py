@@ -0,0 +1,124 @@
+import logging
+from typing import NamedTuple, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_KINDS = ("flat", "hnsw", "ivf")
+
+
+class IndexConfig(NamedTuple):
+    """How the knowledge index is built and searched (see the KNOWLEDGE_INDEX_* settings)."""
+    mode: str = "auto"              # "auto" or one of INDEX_KINDS
+    hnsw_min_vectors: int = 20000   # auto: use HNSW from this many vectors
+    ivf_min_vectors: int = 500000   # auto: use IVF from this many vectors
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 80
+    hnsw_ef_search: int = 64
+    ivf_nprobe: int = 16
+    min_recall: float = 0.95        # recall@k an ANN index must reach against the flat index
+    recall_sample_size: int = 200
+    recall_k: int = 10
+
+
+def choose_index_kind(num_vectors: int, config: IndexConfig) -> str:
+    if config.mode != "auto":
+        if config.mode not in INDEX_KINDS:
+            raise ValueError(f"Unknown knowledge index mode: {config.mode}")
+        return config.mode
+    if num_vectors >= config.ivf_min_vectors:
+        return "ivf"
+    if num_vectors >= config.hnsw_min_vectors:
+        return "hnsw"
+    return "flat"
+
+
+def index_kind(index: Optional[faiss.Index]) -> Optional[str]:
+    if index is None:
+        return None
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def supports_removal(index: Optional[faiss.Index]) -> bool:
+    # HNSW cannot remove vectors and memory-mapped IVF lists cannot be copied,
+    # so only flat indexes are updated in place; the others are rebuilt.
+    return index is None or index_kind(index) == "flat"
+
+
+def search_parameters(index: faiss.Index, config: IndexConfig, selector: Optional[faiss.IDSelector] = None):
+    kind = index_kind(index)
+    if kind == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=config.hnsw_ef_search)
+    elif kind == "ivf":
+        params = faiss.SearchParametersIVF(nprobe=config.ivf_nprobe)
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def _flat_index(vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def _hnsw_index(vectors: np.ndarray, ids: np.ndarray, config: IndexConfig) -> faiss.Index:
+    hnsw = faiss.IndexHNSWFlat(vectors.shape[1], config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    hnsw.hnsw.efConstruction = config.hnsw_ef_construction
+    index = faiss.IndexIDMap2(hnsw)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def _ivf_index(vectors: np.ndarray, ids: np.ndarray, config: IndexConfig) -> faiss.Index:
+    nlist = max(1, int(4 * np.sqrt(len(vectors))))
+    quantizer = faiss.IndexFlatIP(vectors.shape[1])
+    ivf = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+    ivf.train(vectors)
+    index = faiss.IndexIDMap2(ivf)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def measure_recall(candidate: faiss.Index, reference: faiss.Index, queries: np.ndarray, k: int, config: IndexConfig) -> float:
+    """Fraction of the reference index's top-k ids that the candidate also returns."""
+    _, expected = reference.search(queries, k)
+    _, found = candidate.search(queries, k, params=search_parameters(candidate, config))
+    hits = sum(len(set(e[e >= 0]) & set(f[f >= 0])) for e, f in zip(expected, found))
+    total = int((expected >= 0).sum())
+    return hits / total if total else 1.0
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, config: IndexConfig) -> faiss.Index:
+    """
+    Build the index kind chosen for this many vectors.
+
+    An approximate index is only returned if its recall@k on a sample of the
+    corpus's own vectors reaches ``config.min_recall`` against the exact flat
+    index; otherwise the flat index is kept.
+    """
+    flat = _flat_index(vectors, ids)
+    kind = choose_index_kind(len(vectors), config)
+    if kind == "flat":
+        return flat
+
+    candidate = _hnsw_index(vectors, ids, config) if kind == "hnsw" else _ivf_index(vectors, ids, config)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(config.recall_sample_size, len(vectors)), replace=False)
+    recall = measure_recall(candidate, flat, vectors[sample], min(config.recall_k, len(vectors)), config)
+    if recall < config.min_recall:
+        logger.warning("Keeping flat knowledge index: %s recall@%d was %.3f (< %.3f)",
+                       kind, config.recall_k, recall, config.min_recall)
+        return flat
+
+    logger.info("Promoted %s knowledge index for %d vectors (recall@%d %.3f)", kind, len(vectors), config.recall_k, recall)
+    return candidate
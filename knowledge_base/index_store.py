@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Bump whenever the layout of the index or its metadata changes, so old
+# snapshots are never opened by code expecting the new layout.
+INDEX_FORMAT = 5
+
+
+def corpus_key(model_name: str, documents: Iterable[Dict]) -> str:
+    """Hash the embedding model name and every document's identity and content hash."""
+    digest = hashlib.sha256(f"{INDEX_FORMAT}\0{model_name}".encode("utf-8"))
+    for doc in sorted(documents, key=lambda d: str(d["id"])):
+        digest.update(f"\0{doc['id']}\0{doc['title']}\0{doc['domain']}\0{doc['content_hash']}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class KnowledgeIndexStore:
+    """
+    On-disk snapshots of the knowledge FAISS index.
+
+    Each snapshot is stored as ``<key>.faiss`` plus ``<key>.json`` (chunk
+    metadata), where the key is the corpus hash from ``corpus_key``. Snapshots
+    are opened memory-mapped so every worker process shares the same pages.
+    Per-document chunk vectors are also kept under ``vectors/<model>/<cache_key>.npy``
+    so a rebuild only re-embeds documents whose content actually changed.
+
+    The ``CURRENT`` file names the latest snapshot. Workers compare its mtime
+    on each query and reopen the index when another process has updated it.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._current_mtime = None
+        self._current_key = None
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.faiss")
+
+    def _metadata_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _vectors_path(self, model_name: str, cache_key: str) -> str:
+        return os.path.join(self.directory, "vectors", model_name.replace("/", "_"), f"{cache_key}.npy")
+
+    def _atomic_write(self, path: str, write) -> None:
+        # Write to a temp file in the same directory and rename it into place,
+        # so a worker never opens a half-written snapshot.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, key: str) -> Optional[Tuple[faiss.Index, List[Dict]]]:
+        index_path = self._index_path(key)
+        metadata_path = self._metadata_path(key)
+        if not (os.path.exists(index_path) and os.path.exists(metadata_path)):
+            return None
+
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        # IO_FLAG_MMAP_IFC maps the vector storage (flat codes, HNSW storage, IVF lists)
+        # straight from the file, so workers share its pages; IO_FLAG_MMAP does not map a
+        # flat index at all. The mapped arrays are views: copy the index (see
+        # rag_pipeline.owned_copy) before modifying it.
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+        return index, metadata["documents"]
+
+    def save(self, key: str, index: faiss.Index, documents: List[Dict], model_name: str) -> None:
+        def write_metadata(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"model_name": model_name, "documents": documents}, f)
+
+        # Metadata first: a snapshot only counts as present once its index file exists.
+        self._atomic_write(self._metadata_path(key), write_metadata)
+        self._atomic_write(self._index_path(key), lambda path: faiss.write_index(index, path))
+
+    def current_key(self) -> Optional[str]:
+        path = os.path.join(self.directory, "CURRENT")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._current_mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                self._current_key = f.read().strip()
+            self._current_mtime = mtime
+        return self._current_key
+
+    def set_current(self, key: str) -> None:
+        def write_key(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(key)
+
+        self._atomic_write(os.path.join(self.directory, "CURRENT"), write_key)
+
+    def load_vectors(self, model_name: str, cache_key: str) -> Optional[np.ndarray]:
+        path = self._vectors_path(model_name, cache_key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def save_vectors(self, model_name: str, cache_key: str, vectors: np.ndarray) -> None:
+        def write_vectors(path):
+            with open(path, "wb") as f:
+                np.save(f, vectors)
+
+        self._atomic_write(self._vectors_path(model_name, cache_key), write_vectors)
+
+    def prune(self, keep_key: str) -> None:
+        """Remove snapshots other than ``keep_key``; vectors are kept for reuse."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext in (".faiss", ".json") and stem != keep_key:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.chatbot_logic import ChatSystem
+from journaling.journal_chat import (
+    FUTURE_ANCHOR, NEGATIVE_ANCHOR, POSITIVE_ANCHOR, Journal, JournalKnowledge, analyze_response,
+    anchor_embeddings, get_journal_knowledge,
+)
+from knowledge_base.embeddings import encode
+
+
+class Command(BaseCommand):
+    help = "Compare per-turn embedding latency of per-text encoding against the batched/stored-vector paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--history", type=int, default=50, help="Messages in the simulated chat session.")
+        parser.add_argument("--turns", type=int, default=20, help="Turns to average over.")
+
+    def _time(self, fn, turns):
+        start = time.perf_counter()
+        for _ in range(turns):
+            fn()
+        return (time.perf_counter() - start) / turns * 1000
+
+    def handle(self, *args, **options):
+        history_size, turns = options["history"], options["turns"]
+        texts = [f"User: message number {i} about my week\nBot: reply number {i}" for i in range(history_size)]
+        answer = "I want to finish my degree next year and feel proud of it"
+
+        # Warm the model and the anchors so neither timing includes loading them.
+        anchor_embeddings()
+        get_journal_knowledge()
+        stored = encode(texts).embeddings
+
+        def history_per_text():
+            for text in texts:
+                encode([text])
+
+        def history_stored():
+            ChatSystem().load_history([{"full_conversation": t, "embedding": e} for t, e in zip(texts, stored)])
+
+        def analysis_per_text():
+            for text in (answer, FUTURE_ANCHOR, POSITIVE_ANCHOR, NEGATIVE_ANCHOR):
+                encode([text])
+
+        rows = [
+            (f"chat history ({history_size} messages)", self._time(history_per_text, turns), self._time(history_stored, turns)),
+            ("journal answer analysis", self._time(analysis_per_text, turns), self._time(lambda: analyze_response(answer), turns)),
+            # Before, every journal request built the evidence database and its index.
+            ("journal coach setup", self._time(JournalKnowledge, turns), self._time(lambda: Journal({"entry_point": "personal_win"}), turns)),
+        ]
+        self.stdout.write(f"{'path':<32}{'per-text ms':>14}{'new ms':>10}{'speedup':>10}")
+        for name, before, after in rows:
+            self.stdout.write(f"{name:<32}{before:>14.2f}{after:>10.2f}{before / after:>9.1f}x")
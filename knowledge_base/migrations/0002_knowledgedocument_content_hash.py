@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgedocument',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
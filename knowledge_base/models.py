@@ -16,6 +16,8 @@ class KnowledgeDocument(models.Model):
         default="all"
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 of the file contents, used to key the persisted FAISS index.
+    content_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     def __str__(self):
         return self.title
@@ -1,54 +1,173 @@
-import os 
-import faiss 
-import numpy as np          
-from typing import List,Dict 
-from sentence_transformers import SentenceTransformer
+import os
+import faiss
+import numpy as np
+from typing import List,Dict
+from .embeddings import DEFAULT_MODEL_NAME, encode, registry
+from .cache import LRUCache
+from .index_factory import IndexConfig, build_index, index_kind, search_parameters, supports_removal
+
+# Vector ids are (domain code << DOMAIN_ID_SHIFT) | (document pk << CHUNK_ID_BITS) | chunk number,
+# so every domain is one contiguous id range that a search can be restricted to.
+CHUNK_ID_BITS = 20
+DOMAIN_ID_SHIFT = 48
+DOMAIN_CODES = {"all": 0, "journal": 1, "mindset": 2, "general": 3, "therapy": 4}
+# Documents with a domain outside KnowledgeDocument's choices only match unfiltered queries.
+UNKNOWN_DOMAIN_CODE = 15
+
+def chunk_vector_id(doc_id,chunk_no:int,domain:str = "all") -> int:
+    domain_code = DOMAIN_CODES.get(domain,UNKNOWN_DOMAIN_CODE)
+    return (domain_code << DOMAIN_ID_SHIFT) | (int(doc_id) << CHUNK_ID_BITS) | chunk_no
+
+def vector_document_id(vector_id:int) -> int:
+    return (vector_id >> CHUNK_ID_BITS) & ((1 << (DOMAIN_ID_SHIFT - CHUNK_ID_BITS)) - 1)
+
+def _domain_range(domain:str) -> faiss.IDSelector:
+    code = DOMAIN_CODES[domain]
+    return faiss.IDSelectorRange(code << DOMAIN_ID_SHIFT,(code + 1) << DOMAIN_ID_SHIFT)
+
+def owned_copy(index: faiss.Index) -> faiss.Index:
+    # A copy that owns its arrays. clone_index keeps the views of a memory-mapped
+    # (IO_FLAG_MMAP_IFC) index, and resizing a view aborts the process.
+    return faiss.deserialize_index(faiss.serialize_index(index))
 
 class RAGPipeline:
-    def __init__(self,model_name:str = "all-MiniLM-L6-v2") -> None:
-        # Initialize embedding model and FAISS index 
-        self.encoder = SentenceTransformer(model_name)
-        self.dimension = self.encoder.get_sentence_embedding_dimension()
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.documents: List[Dict] = []
-        self.embeddings = None 
+    def __init__(self,model_name:str = DEFAULT_MODEL_NAME,index_config:IndexConfig = None,
+                 embedding_cache:LRUCache = None,result_cache:LRUCache = None) -> None:
+        # The embedding model comes from the shared registry and is only
+        # loaded when the first document or query needs it.
+        self.model_name = model_name
+        # Which index kind to build and how to search it (see index_factory)
+        self.index_config = index_config or IndexConfig()
+        self.index = None
+        # Chunk metadata keyed by FAISS vector id (see chunk_vector_id)
+        self.documents: Dict[int, Dict] = {}
+        # Hash of the corpus the current index was built from (see index_store.corpus_key)
+        self.corpus_key = None
+        # Bumped on every index change; cached results are keyed by it, so stale ones are never read.
+        self.index_version = 0
+        # Query embeddings keyed by normalized text, and results keyed by (version, query, domain, top_k)
+        self.embedding_cache = embedding_cache if embedding_cache is not None else LRUCache(maxsize=1024)
+        self.result_cache = result_cache if result_cache is not None else LRUCache(maxsize=1024)
+
+    @property
+    def dimension(self) -> int:
+        return registry.dimension(self.model_name)
 
     def _embed_texts(self,texts:List[str]) -> np.ndarray:
-        # Generate normalized embeddings for texts.
-        embeddings = self.encoder.encode(texts,convert_to_numpy=True)
-        embeddings = embeddings / np.linalg.norm(embeddings,axis=1,keepdims=True)
-        return embeddings.astype("float32")
-    
-    def add_documents(self,docs: List[Dict]):
-        new_embeddings = self._embed_texts([doc["text"] for doc in docs])
-        if self.embeddings is None: 
-            self.embeddings = new_embeddings
-        else: 
-            self.embeddings = np.vstack([self.embeddings,new_embeddings])
-
-        self.index.add(new_embeddings)
-        self.documents.extend(docs)
+        # Generate normalized embeddings for texts (batched with concurrent requests).
+        return encode(texts,model_name=self.model_name,normalize=True).embeddings
+
+    @staticmethod
+    def normalize_query(text:str) -> str:
+        # The model's tokenizer is uncased, so case and extra whitespace do not change the embedding.
+        return " ".join(text.lower().split())
+
+    def _embed_query(self,query:str) -> np.ndarray:
+        vector = self.embedding_cache.get(query)
+        if vector is None:
+            vector = self._embed_texts([query])
+            self.embedding_cache.set(query,vector)
+        return vector
+
+    def cache_stats(self) -> Dict[str,Dict[str,int]]:
+        return {"embeddings": self.embedding_cache.stats(),"results": self.result_cache.stats()}
+
+    def _new_index(self,dimension:int) -> faiss.Index:
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    @property
+    def index_kind(self) -> str:
+        return index_kind(self.index)
+
+    def supports_upsert(self) -> bool:
+        # Only flat indexes are updated in place; HNSW/IVF are rebuilt by the caller.
+        return supports_removal(self.index)
+
+    def build_index(self,chunks: List[Dict],vectors: np.ndarray) -> faiss.Index:
+        # Flat, HNSW or IVF depending on corpus size and index_config.
+        ids = np.array([chunk_vector_id(chunk["id"],chunk["chunk"],chunk["domain"]) for chunk in chunks],dtype="int64")
+        return build_index(vectors,ids,self.index_config)
+
+    def load_index(self,index,chunks: List[Dict],corpus_key:str = None):
+        # Swap in a prebuilt (usually memory-mapped) index and its chunk metadata.
+        self.documents = {chunk_vector_id(chunk["id"],chunk["chunk"],chunk["domain"]): chunk for chunk in chunks}
+        self.index = index
+        self.corpus_key = corpus_key
+        self.index_version += 1
+
+    def upsert_document(self,doc_id,chunks: List[Dict],vectors: np.ndarray):
+        """Replace all of a document's chunk vectors, leaving the rest of the index untouched."""
+        if self.index is None and not chunks:
+            return
+        if not self.supports_upsert():
+            raise ValueError(f"{self.index_kind} knowledge index cannot be updated in place; rebuild it")
+        # Copy-on-write: the live index may be a read-only memory map and can be
+        # searched concurrently, so mutate a private copy and swap it in.
+        index = owned_copy(self.index) if self.index is not None else self._new_index(vectors.shape[1])
+        # Remove by the ids actually stored: the document's domain may have changed.
+        old_ids = [vid for vid in self.documents if vector_document_id(vid) == int(doc_id)]
+        if old_ids:
+            index.remove_ids(np.array(old_ids,dtype="int64"))
+        documents = {vid: chunk for vid, chunk in self.documents.items() if vector_document_id(vid) != int(doc_id)}
+        if chunks:
+            ids = np.array([chunk_vector_id(doc_id,chunk["chunk"],chunk["domain"]) for chunk in chunks],dtype="int64")
+            index.add_with_ids(vectors,ids)
+            documents.update(zip(ids.tolist(),chunks))
+        self.documents = documents
+        self.index = index
+        self.index_version += 1
+
+    def remove_document(self,doc_id) -> bool:
+        if self.index is None or not any(vector_document_id(vid) == int(doc_id) for vid in self.documents):
+            return False
+        self.upsert_document(doc_id,[],None)
+        return True
 
     def query(self, text:str,top_k: int = 3, domain:str= None) -> List[Dict]:
-        # Search for relevant documents,optionallly filtered by domain
-        if not self.documents:
+        """
+        Return the top_k most similar chunks.
+
+        With a domain, the search is restricted to that domain's chunks plus
+        the "all" chunks by an id-range selector, so the results are the true
+        top_k within those domains at the cost of one unfiltered search.
+        """
+        index, documents, version = self.index, self.documents, self.index_version
+        if index is None or not documents:
+            return []
+        if domain and domain not in DOMAIN_CODES:
             return []
-        
-        qurey_vec = self._embed_texts([text])
-        scores,indices = self.index.search(qurey_vec,top_k)
+
+        query = self.normalize_query(text)
+        result_key = (version,query,domain,top_k)
+        cached = self.result_cache.get(result_key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+
+        qurey_vec = self._embed_query(query)
+        if domain and domain != "all":
+            # Keep the selectors referenced until the search returns.
+            domain_range, all_range = _domain_range(domain), _domain_range("all")
+            selector = faiss.IDSelectorOr(domain_range,all_range)
+        elif domain == "all":
+            selector = _domain_range("all")
+        else:
+            selector = None
+        params = search_parameters(index,self.index_config,selector)
+        scores,indices = index.search(qurey_vec,top_k,params=params)
 
         results = []
         for score,idx in zip(scores[0],indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx]
-                if domain and doc["domain"] != domain:
-                    continue
+            doc = documents.get(int(idx))
+            if doc is not None:
                 results.append({
                     "id": doc["id"],
                     "title": doc["title"],
                     "text": doc["text"],
                     "domain": doc["domain"],
+                    "chunk": doc["chunk"],
+                    "start": doc["start"],
+                    "end": doc["end"],
                     "similarity": float(score)
                 })
+        self.result_cache.set(result_key,[dict(result) for result in results])
         return results
-        
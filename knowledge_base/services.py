@@ -1,23 +1,229 @@
-import os  
+import hashlib
+import os
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from django.conf import settings
 from .models import KnowledgeDocument
 from .rag_pipeline import RAGPipeline
+from .index_store import INDEX_FORMAT, KnowledgeIndexStore, corpus_key
+from .index_factory import IndexConfig, choose_index_kind
+from .cache import LRUCache
+from .chunking import iter_chunks
 
-rag = RAGPipeline()
+INDEX_CONFIG = IndexConfig(
+    mode=getattr(settings, "KNOWLEDGE_INDEX_MODE", "auto"),
+    hnsw_min_vectors=getattr(settings, "KNOWLEDGE_INDEX_HNSW_MIN_VECTORS", 20000),
+    ivf_min_vectors=getattr(settings, "KNOWLEDGE_INDEX_IVF_MIN_VECTORS", 500000),
+    hnsw_m=getattr(settings, "KNOWLEDGE_INDEX_HNSW_M", 32),
+    hnsw_ef_construction=getattr(settings, "KNOWLEDGE_INDEX_HNSW_EF_CONSTRUCTION", 80),
+    hnsw_ef_search=getattr(settings, "KNOWLEDGE_INDEX_HNSW_EF_SEARCH", 64),
+    ivf_nprobe=getattr(settings, "KNOWLEDGE_INDEX_IVF_NPROBE", 16),
+    min_recall=getattr(settings, "KNOWLEDGE_INDEX_MIN_RECALL", 0.95),
+)
+rag = RAGPipeline(
+    index_config=INDEX_CONFIG,
+    embedding_cache=LRUCache(
+        maxsize=getattr(settings, "KNOWLEDGE_QUERY_CACHE_SIZE", 1024),
+        ttl=getattr(settings, "KNOWLEDGE_QUERY_CACHE_TTL", None),
+    ),
+    result_cache=LRUCache(
+        maxsize=getattr(settings, "KNOWLEDGE_RESULT_CACHE_SIZE", 1024),
+        ttl=getattr(settings, "KNOWLEDGE_RESULT_CACHE_TTL", None),
+    ),
+)
+store = KnowledgeIndexStore(
+    getattr(settings, "KNOWLEDGE_INDEX_DIR", os.path.join(settings.BASE_DIR, "knowledge_index"))
+)
+CHUNK_SIZE = getattr(settings, "KNOWLEDGE_CHUNK_SIZE", 800)
+CHUNK_OVERLAP = getattr(settings, "KNOWLEDGE_CHUNK_OVERLAP", 150)
+EMBED_BATCH_SIZE = getattr(settings, "KNOWLEDGE_EMBED_BATCH_SIZE", 32)
+_load_lock = threading.Lock()
+
+def document_content_hash(doc: KnowledgeDocument) -> str:
+    # SHA-256 of the stored file, read in chunks.
+    digest = hashlib.sha256()
+    with doc.document_file.open("rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def update_content_hash(doc: KnowledgeDocument) -> str:
+    # Recompute the hash of a saved document and store it without re-triggering post_save.
+    content_hash = document_content_hash(doc)
+    if content_hash != doc.content_hash:
+        KnowledgeDocument.objects.filter(pk=doc.pk).update(content_hash=content_hash)
+        doc.content_hash = content_hash
+    return content_hash
+
+def _document_entry(doc: KnowledgeDocument) -> Dict:
+    return {
+        "id": str(doc.id),
+        "title": doc.title,
+        "domain": doc.domain,
+        "content_hash": doc.content_hash,
+    }
+
+def _corpus_key(entries) -> str:
+    # Chunking settings change the vectors and the index settings change the
+    # structure built from them, so both are part of the key.
+    index_settings = ":".join(str(value) for value in INDEX_CONFIG)
+    return corpus_key(f"{rag.model_name}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:{index_settings}", entries)
+
+def _ingest_document(doc: KnowledgeDocument) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Stream a document into overlapping chunks and embed them in batches.
+
+    Vectors are cached per content hash, chunking settings and INDEX_FORMAT, so
+    unchanged documents are only re-chunked (cheap) and never re-embedded. A
+    cached array whose row count no longer matches the chunks is a miss.
+    """
+    entry = _document_entry(doc)
+    cache_key = f"{doc.content_hash}-{CHUNK_SIZE}-{CHUNK_OVERLAP}-v{INDEX_FORMAT}"
+    cached = store.load_vectors(rag.model_name, cache_key)
+
+    chunks = []
+    batches = []
+    pending = []
+    with doc.document_file.open("rb") as f:
+        for chunk_no, chunk in enumerate(iter_chunks(f, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)):
+            chunks.append(dict(entry, text=chunk.text, chunk=chunk_no, start=chunk.start, end=chunk.end))
+            if cached is None:
+                pending.append(chunk.text)
+                if len(pending) >= EMBED_BATCH_SIZE:
+                    batches.append(rag._embed_texts(pending))
+                    pending = []
+    if cached is not None:
+        if len(cached) == len(chunks):
+            return chunks, cached
+        # Stale vectors (the chunker's output changed): embed every chunk again.
+        texts = [chunk["text"] for chunk in chunks]
+        batches = [rag._embed_texts(texts[i:i + EMBED_BATCH_SIZE]) for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+
+    if pending:
+        batches.append(rag._embed_texts(pending))
+    vectors = np.vstack(batches) if batches else np.zeros((0, 0), dtype="float32")
+    if chunks:
+        store.save_vectors(rag.model_name, cache_key, vectors)
+    return chunks, vectors
+
+def _persist_index():
+    # Snapshot the in-memory index, point CURRENT at it and reopen it memory-mapped.
+    chunks = list(rag.documents.values())
+    key = _corpus_key({chunk["id"]: chunk for chunk in chunks}.values())
+    if not chunks:
+        rag.load_index(None, [], corpus_key=key)
+        store.set_current(key)
+        return
+    store.save(key, rag.index, chunks, rag.model_name)
+    store.set_current(key)
+    store.prune(key)
+    rag.load_index(*store.load(key), corpus_key=key)
+
+def _build_snapshot(rows, key: str):
+    # Build and save a fresh index for these documents (the index kind is
+    # chosen by corpus size); only documents without cached vectors are embedded.
+    chunks = []
+    vectors = []
+    for doc in rows:
+        doc_chunks, doc_vectors = _ingest_document(doc)
+        if doc_chunks:
+            chunks.extend(doc_chunks)
+            vectors.append(doc_vectors)
+    if not chunks:
+        return None
+    store.save(key, rag.build_index(chunks, np.vstack(vectors)), chunks, rag.model_name)
+    store.prune(key)
+    return store.load(key)
+
+def _load_corpus(rows):
+    for doc in rows:
+        if not doc.content_hash:
+            update_content_hash(doc)
+    entries = [_document_entry(doc) for doc in rows]
+    key = _corpus_key(entries)
+    if rag.corpus_key == key:
+        return
+    snapshot = store.load(key) if rows else None
+    if snapshot is None and rows:
+        snapshot = _build_snapshot(rows, key)
+    store.set_current(key)
+    if snapshot is None:
+        rag.load_index(None, [], corpus_key=key)
+    else:
+        rag.load_index(*snapshot, corpus_key=key)
 
 def load_documents():
-    # Load all documents from DB into FAISS index.
-    docs = []
-    for doc in KnowledgeDocument.objects.all():
-        with doc.document_file.open("rb") as f:
-            text = f.read().decode("utf-8")
-        docs.append({
-            "id": str(doc.id), 
-            "title": doc.title,
-            "text": text,
-            "domain": doc.domain,
-        })
-    if docs:
-        rag.add_documents(docs)
+    """
+    Point the shared RAG pipeline at the index for the current corpus.
+
+    The corpus key is derived from the documents' content hashes, so this only
+    touches the database when nothing changed. A matching on-disk snapshot is
+    opened memory-mapped; otherwise the index is rebuilt, re-embedding only the
+    documents whose content hash has no cached vectors.
+    """
+    with _load_lock:
+        _load_corpus(list(KnowledgeDocument.objects.order_by("id")))
+
+def _needs_rebuild(added: int) -> bool:
+    # HNSW/IVF indexes cannot be updated in place, and a flat index that grows
+    # past the HNSW threshold should be rebuilt as the approximate kind.
+    if not rag.supports_upsert():
+        return True
+    total = len(rag.documents) + added
+    return choose_index_kind(total, INDEX_CONFIG) != "flat"
+
+def index_document(doc: KnowledgeDocument):
+    """Chunk and embed one saved document and replace its vectors in the index."""
+    ensure_loaded()
+    with _load_lock:
+        update_content_hash(doc)
+        chunks, vectors = _ingest_document(doc)
+        if _needs_rebuild(len(chunks)):
+            # Every other document's vectors are cached, so this only re-reads them.
+            _load_corpus(list(KnowledgeDocument.objects.order_by("id")))
+            return
+        rag.upsert_document(doc.id, chunks, vectors)
+        _persist_index()
+
+def remove_document(doc_id):
+    """Drop a deleted document's vectors from the index."""
+    ensure_loaded()
+    with _load_lock:
+        if not any(chunk["id"] == str(doc_id) for chunk in rag.documents.values()):
+            return
+        if _needs_rebuild(0):
+            _load_corpus(list(KnowledgeDocument.objects.exclude(pk=doc_id).order_by("id")))
+            return
+        if rag.remove_document(doc_id):
+            _persist_index()
+
+def ensure_loaded():
+    # Open the index lazily on first use, and reopen it when another worker
+    # has published a newer snapshot (a stat() of the CURRENT file per call).
+    current = store.current_key()
+    if rag.corpus_key is not None and (current is None or current == rag.corpus_key):
+        return
+    try:
+        if rag.corpus_key is not None and current:
+            snapshot = store.load(current)
+            if snapshot is not None:
+                with _load_lock:
+                    rag.load_index(*snapshot, corpus_key=current)
+                return
+        load_documents()
+    except Exception as e:
+        print(f"Could not load knowledge base index: {e}")
 
 def query_knowledge(query: str,domain:str = None):
+    ensure_loaded()
     return rag.query(query,top_k=3,domain=domain)
+
+def knowledge_version() -> str:
+    # Key of the loaded corpus (derived from its documents' content hashes), the same in every worker.
+    ensure_loaded()
+    return rag.corpus_key or ""
+
+def knowledge_cache_stats():
+    # Hit/miss/eviction counters of the query embedding and result caches (per process).
+    return rag.cache_stats()
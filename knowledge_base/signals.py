@@ -1,12 +1,19 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import KnowledgeDocument
-from .services import load_documents
+from .services import index_document, remove_document
 
 @receiver(post_save, sender=KnowledgeDocument)
 def knowledge_document_post_save(sender, instance, created, **kwargs):
     """
-    A signal handler that reloads the knowledge base documents whenever a KnowledgeDocument is saved.
+    A signal handler that re-indexes a KnowledgeDocument whenever it is saved.
+    Only that document is embedded, and its previous vectors are replaced.
     """
-    print("Signal received: Reloading knowledge base documents.")
-    load_documents()
+    print(f"Signal received: Re-indexing knowledge document {instance.pk}.")
+    index_document(instance)
+
+@receiver(post_delete, sender=KnowledgeDocument)
+def knowledge_document_post_delete(sender, instance, **kwargs):
+    """Removes a deleted KnowledgeDocument's vectors from the knowledge base index."""
+    print(f"Signal received: Removing knowledge document {instance.pk} from the index.")
+    remove_document(instance.pk)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mindset', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mindsetmessage',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='mindset_message_keyset'),
+        ),
+    ]
@@ -74,7 +74,7 @@ class MindsetCoach:
         retrieved = query_knowledge(user_message,domain="mindset")
         if retrieved:
             evidence_context = "n\Retrived Insights:\n" + "\n".join(
-                [f"- {doc['title']}: {doc['text'][:120]}..." for doc in retrieved]
+                [f"- {doc['title']}: {doc['text'].strip()}" for doc in retrieved]
             )
 ###############################################################
 
@@ -25,3 +25,7 @@ class MindsetMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination of a session's exchanges (see op_mental/pagination.py)
+            models.Index(fields=['session', 'timestamp', 'id'], name='mindset_message_keyset'),
+        ]
@@ -1,6 +1,7 @@
 
 import os
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
@@ -8,12 +9,18 @@ from rest_framework import status
 from .models import MindsetSession, MindsetMessage
 from .serializers import MindsetRequestSerializer, MindsetResponseSerializer
 from .mindset_logic import MindsetCoach
-
-class MindsetCoachApiView(APIView):
-    """API view to interact with the Mindset Coach chatbot."""
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
+from subscriptions.permissions import HasCoachEntitlement
+from op_mental.concurrency import run_blocking
+from op_mental.pagination import KeysetPagination
+from op_mental.crisis import crisis_response, detect_crisis
+from chatbot.metering import LIMIT_REACHED_MESSAGE, meter
+
+class MindsetCoachApiView(AsyncAPIView):
+    """API view to interact with the Mindset Coach chatbot (async; the coach runs off the event loop)."""
+    permission_classes = [IsAuthenticated, HasCoachEntitlement]
+    coach_name = "mindset"
+
+    async def post(self, request, *args, **kwargs):
         serializer = MindsetRequestSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -24,6 +31,23 @@ class MindsetCoachApiView(APIView):
         user = request.user
 
         try:
+            # Crisis check before the coach runs: answer with safety resources right
+            # away, without charging the message or advancing the session.
+            crisis = await run_blocking(detect_crisis, user_message)
+            if crisis is not None:
+                session = await MindsetSession.objects.aget(id=session_id, user=user) if session_id else None
+                reply = crisis_response(crisis)
+                if session is not None:
+                    await MindsetMessage.objects.acreate(session=session, user_message=user_message, coach_response=reply)
+                data = MindsetResponseSerializer({
+                    'reply': reply,
+                    'session_id': session.id if session else None,
+                    'current_step': session.current_step if session else 1,
+                    'is_complete': False
+                }).data
+                data['crisis'] = True
+                return Response(data, status=status.HTTP_200_OK)
+
             api_key = os.getenv('OPENAI_API_KEY')
             if not api_key:
                 return Response({"error": "OpenAI API key not configured."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -32,12 +56,12 @@ class MindsetCoachApiView(APIView):
 
             if not session_id:
                 # New session
-                session = MindsetSession.objects.create(user=user)
+                session = await MindsetSession.objects.acreate(user=user)
                 welcome_message = coach.get_welcome_message()
                 initial_question = coach.get_initial_question()
                 full_welcome_message = f"{welcome_message}\n\n{initial_question}"
                 
-                MindsetMessage.objects.create(
+                await MindsetMessage.objects.acreate(
                     session=session,
                     user_message="<start>",
                     coach_response=full_welcome_message
@@ -51,7 +75,7 @@ class MindsetCoachApiView(APIView):
                 }
             else:
                 # Existing session
-                session = MindsetSession.objects.get(id=session_id, user=user)
+                session = await MindsetSession.objects.aget(id=session_id, user=user)
                 
                 # Simple validation from mindset_mantra.py
                 message_lower = user_message.lower().strip()
@@ -60,7 +84,7 @@ class MindsetCoachApiView(APIView):
 
                 if message_lower in minimal_responses or word_count < 2:
                     # Get the last question to repeat it
-                    last_message = MindsetMessage.objects.filter(session=session).order_by('-timestamp').first()
+                    last_message = await MindsetMessage.objects.filter(session=session).order_by('-timestamp').afirst()
                     if last_message:
                         question_to_repeat = last_message.coach_response
                         # A more specific prompt for the user
@@ -77,15 +101,23 @@ class MindsetCoachApiView(APIView):
                         'is_complete': False
                     }, status=status.HTTP_200_OK)
 
-                messages_count = MindsetMessage.objects.filter(session=session).count()
+                if not await meter.acharge(user, self.coach_name):
+                    return Response({
+                        'reply': LIMIT_REACHED_MESSAGE,
+                        'session_id': session.id,
+                        'current_step': session.current_step,
+                        'is_complete': False
+                    }, status=status.HTTP_208_ALREADY_REPORTED)
+
+                messages_count = await MindsetMessage.objects.filter(session=session).acount()
 
                 # Ongoing conversation
-                db_messages = MindsetMessage.objects.filter(session=session).order_by('timestamp')
+                db_messages = MindsetMessage.objects.filter(session=session).select_related('session').order_by('timestamp')
                 history = [{
                     "user_message": msg.user_message,
                     "coach_response": msg.coach_response,
                     'step': msg.session.current_step
-                } for msg in db_messages]
+                } async for msg in db_messages]
 
                 session_data = {
                     'current_step': session.current_step,
@@ -93,11 +125,11 @@ class MindsetCoachApiView(APIView):
                     'history': history
                 }
 
-                response = coach.get_response(user_message, session_data)
+                response = await run_blocking(coach.get_response, user_message, session_data)
                 coach_response = response['reply']
                 updated_state = response['updated_state']
 
-                MindsetMessage.objects.create(
+                await MindsetMessage.objects.acreate(
                     session=session,
                     user_message=user_message,
                     coach_response=coach_response
@@ -105,7 +137,7 @@ class MindsetCoachApiView(APIView):
 
                 session.current_step = updated_state['current_step']
                 session.user_responses = updated_state['user_responses']
-                session.save()
+                await session.asave()
                 
                 response_data = {
                     'reply': coach_response,
@@ -122,13 +154,15 @@ class MindsetCoachApiView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class MindsetHistoryView(APIView):
-    """API view to fetch the conversation history of a specific mindset session."""
+    """API view to fetch the conversation history of a specific mindset session, one keyset page of exchanges at a time."""
     permission_classes = [IsAuthenticated]
+    keyset_field = 'timestamp'
 
     def get(self, request, session_id, *args, **kwargs):
         try:
             session = MindsetSession.objects.get(id=session_id, user=request.user)
-            messages = MindsetMessage.objects.filter(session=session).order_by('timestamp')
+            paginator = KeysetPagination()
+            messages = paginator.paginate_queryset(MindsetMessage.objects.filter(session=session), request, view=self)
             
             history = []
             for msg in messages:
@@ -136,6 +170,6 @@ class MindsetHistoryView(APIView):
                     history.append({'author': 'user', 'message': msg.user_message, 'timestamp': msg.timestamp})
                 history.append({'author': 'bot', 'message': msg.coach_response, 'timestamp': msg.timestamp})
 
-            return Response(history, status=status.HTTP_200_OK)
+            return paginator.get_paginated_response(history)
         except MindsetSession.DoesNotExist:
             return Response({"detail": "Session not found."}, status=status.HTTP_404_NOT_FOUND)
@@ -3,6 +3,11 @@ ASGI config for op_mental project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The coach endpoints (chatbot, journaling, mindset, internal challenge) are
+async views, so serve the project through this module with an ASGI server,
+e.g. ``uvicorn op_mental.asgi:application``, to keep many LLM round-trips in
+flight per process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
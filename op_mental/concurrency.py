@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+from django.conf import settings
+from django.db import close_old_connections
+
+# Coach logic (journal, challenge, mindset) is synchronous and makes blocking
+# OpenAI/embedding calls deep inside. Async views run it here instead of on the
+# event loop, so a slow LLM round-trip never holds an ASGI worker. The pool is
+# sized for I/O wait, not CPU.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "COACH_THREAD_POOL_SIZE", 200),
+    thread_name_prefix="coach",
+)
+
+# Independent calls that coach code (already on a coach thread) fans out with
+# run_concurrently. A separate pool, so a full coach pool cannot leave them
+# queued behind the very threads that wait for them.
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "COACH_FANOUT_POOL_SIZE", 50),
+    thread_name_prefix="coach-fanout",
+)
+
+
+def _call_and_release_connection(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Pool threads outlive requests, so close any DB connection they opened.
+        close_old_connections()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Await a blocking call on the coach thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(_call_and_release_connection, fn, *args, **kwargs)
+    )
+
+
+def submit_blocking(fn, *args, **kwargs) -> Future:
+    """
+    Start a blocking call on the coach thread pool without waiting for it. The
+    pool belongs to the process, so the call outlives the request (and, under
+    WSGI, the request's throwaway event loop) that started it.
+    """
+    return _executor.submit(_call_and_release_connection, fn, *args, **kwargs)
+
+
+def run_concurrently(calls: Sequence[Callable[[], Any]], fallbacks: Sequence[Callable[[], Any]],
+                     timeout: float) -> List[Any]:
+    """
+    Run independent blocking calls at the same time and return their results in
+    order. A call that raises, or has not finished ``timeout`` seconds after they
+    all started, yields its fallback's result instead; the other calls are not
+    affected. Calls that miss the deadline are left to finish in the background,
+    so give them their own timeouts too.
+    """
+    deadline = time.monotonic() + timeout
+    futures = [_fanout_executor.submit(_call_and_release_connection, call) for call in calls]
+    results = []
+    for future, fallback in zip(futures, fallbacks):
+        try:
+            results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+        except Exception:  # the call's own error, or TimeoutError
+            future.cancel()
+            results.append(fallback())
+    return results
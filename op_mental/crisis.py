@@ -0,0 +1,250 @@
+"""
+In-process crisis detection that runs before any LLM call.
+
+The categories are the immediate-risk symptoms listed in the referral logic
+document (CRISIS_REFERRAL_DOC): suicidality, hallucinations, paranoia, ...
+A message is checked in two steps:
+
+1. Phrase matching: one precompiled regex over explicit phrases per category.
+   Costs microseconds, and catches the unambiguous cases.
+2. Embedding similarity: the message's sentences are encoded in one batch and
+   compared with one centroid per category (the mean embedding of the category
+   name and a few example statements). Catches paraphrases.
+
+When either fires, ``crisis_response`` gives the document's immediate-need
+statement plus the 988 / 741741 / 911 resources, which the views send without
+waiting on the LLM. Matching errs on the side of firing: a false positive costs
+one unneeded referral, a miss costs much more.
+"""
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from django.conf import settings
+
+from knowledge_base.embeddings import encode
+
+logger = logging.getLogger(__name__)
+
+CRISIS_SIMILARITY_THRESHOLD = getattr(settings, "CRISIS_SIMILARITY_THRESHOLD", 0.6)
+CRISIS_REFERRAL_DOC = getattr(
+    settings, "CRISIS_REFERRAL_DOC",
+    Path(settings.MEDIA_ROOT) / "knowledge_docs" / "Mental_Health_Referral_Logic.txt",
+)
+
+# Used when the referral document is missing or does not parse.
+DEFAULT_CATEGORIES = [
+    "Suicidality", "Hallucinations", "Paranoia", "Delusions",
+    "Severe dissociation", "Extreme hopelessness", "Thoughts of harming others",
+]
+DEFAULT_STATEMENT = (
+    "I am not designed or capable of helping you with these feelings or experiences. "
+    "Please contact your local licensed mental health provider as soon as possible, and "
+    "discontinue using this app until you are being seen by a licensed mental health professional."
+)
+
+CRISIS_RESOURCES = """If you are in danger or thinking about harming yourself or someone else, please reach out right now:
+- National Suicide Prevention Lifeline: call or text 988 (US)
+- Crisis Text Line: text HOME to 741741
+- Emergency Services: 911"""
+
+# Explicit phrases per category (lowercase, matched on word boundaries and not followed
+# by an apostrophe, so "hurt someone's feelings" is not "hurt someone"). Phrases that are
+# also sports or everyday idioms ("kill them in the final", "no way out of this slump",
+# "the win still feels unreal", "I cut myself cooking", "could kill someone for a coffee")
+# are only listed in a first-person form that rules the idiom out; paraphrases are left
+# to the embedding step.
+CRISIS_PHRASES: Dict[str, List[str]] = {
+    "suicidality": [
+        "kill myself", "killing myself", "end my life", "ending my life", "take my own life",
+        "suicidal", "commit suicide", "committing suicide", "thinking about suicide", "thoughts of suicide",
+        "attempt suicide", "attempted suicide", "suicide attempt", "suicide plan", "suicide note",
+        "want to die", "wanna die", "better off dead", "end it all",
+        "don't want to be alive", "don't want to live", "better off without me",
+        "no reason to live", "not worth living",
+        "hurt myself", "hurting myself", "harm myself", "self harm", "self-harm",
+        "cut myself on purpose", "cutting myself on purpose", "started cutting myself", "keep cutting myself",
+        "overdose on", "take an overdose",
+    ],
+    "hallucinations": [
+        "hearing voices", "hear voices", "voices tell me", "voices telling me", "voices in my head",
+        "seeing things that aren't there", "see things that aren't there",
+    ],
+    "paranoia": [
+        "everyone is watching me", "they are watching me", "someone is following me",
+        "people are following me", "following me everywhere", "out to get me", "spying on me", "poisoning me", "plotting against me",
+    ],
+    "delusions": [
+        "controlling my thoughts", "putting thoughts in my head", "putting thoughts into my head",
+        "messages through the tv", "i have special powers", "chosen by god to",
+    ],
+    "severe dissociation": [
+        "nothing feels real", "i don't feel real", "i feel unreal",
+        "outside my body", "not in my body", "don't know who i am anymore", "watching myself from outside",
+    ],
+    "extreme hopelessness": [
+        "no point in living", "no point in anything", "nothing will ever get better",
+        "completely hopeless", "there is no hope", "can't go on living", "don't want to go on living",
+    ],
+    "thoughts of harming others": [
+        "i want to kill him", "i want to kill her", "i'm going to kill him", "i'm going to kill her",
+        "i am going to kill him", "i am going to kill her", "i want to kill someone", "i'm going to kill someone",
+        "i want to hurt someone", "i'm going to hurt someone", "i could hurt someone", "i want to hurt somebody",
+        "i want to harm someone", "i want to harm others", "want to hurt people",
+    ],
+}
+
+# Example statements that, with the category name, make up each centroid.
+CRISIS_EXAMPLES: Dict[str, List[str]] = {
+    "suicidality": [
+        "I want to kill myself", "I don't want to be alive anymore",
+        "I keep thinking about ending my life", "Everyone would be better off without me",
+    ],
+    "hallucinations": [
+        "I hear voices that nobody else can hear", "I see people who aren't really there",
+    ],
+    "paranoia": [
+        "I'm sure people are following me and watching everything I do",
+        "My neighbours are secretly plotting to hurt me",
+    ],
+    "delusions": [
+        "The TV is sending me secret messages", "Someone is putting thoughts into my head",
+    ],
+    "severe dissociation": [
+        "Nothing around me feels real anymore", "I feel like I'm watching myself from outside my body",
+    ],
+    "extreme hopelessness": [
+        "There is no way out and nothing will ever get better", "I have completely given up on everything",
+    ],
+    "thoughts of harming others": [
+        "I want to hurt the people who did this to me", "I keep thinking about killing him",
+    ],
+}
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+MAX_SENTENCES = 8
+
+
+class CrisisSignal(NamedTuple):
+    category: str
+    method: str  # "phrase" or "embedding"
+    score: float
+    evidence: str
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("’", "'").replace("‘", "'").split())
+
+
+def load_referral_doc(path) -> Optional[Dict]:
+    """The urgent-referral symptoms and immediate-need statement from the referral logic document."""
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except OSError as e:
+        logger.warning("Crisis referral document %s unreadable: %s", path, e)
+        return None
+
+    categories = []
+    symptoms_line = re.search(r"(?:For the following symptoms|Symptoms requiring urgent referral):(.*)", text)
+    if symptoms_line:
+        categories = [name.strip() for name in symptoms_line.group(1).split(" - ") if name.strip()]
+    statement = re.search(r"“(I am not designed.*?)”", text)
+    if not categories:
+        return None
+    return {"categories": categories, "statement": statement.group(1) if statement else DEFAULT_STATEMENT}
+
+
+class CrisisDetector:
+    def __init__(self, categories: List[str], statement: str = DEFAULT_STATEMENT,
+                 threshold: float = CRISIS_SIMILARITY_THRESHOLD):
+        self.categories = [_normalize(name) for name in categories]
+        self.statement = statement
+        self.threshold = threshold
+
+        # One alternation with a named group per category, compiled once.
+        groups, self._group_categories = [], {}
+        for position, category in enumerate(self.categories):
+            phrases = sorted(CRISIS_PHRASES.get(category, [category]), key=len, reverse=True)
+            group = f"c{position}"
+            self._group_categories[group] = category
+            groups.append(f"(?P<{group}>" + "|".join(re.escape(phrase) for phrase in phrases) + ")")
+        self._pattern = re.compile(r"\b(?:" + "|".join(groups) + r")\b(?!')")
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_referral_doc(cls, path=CRISIS_REFERRAL_DOC) -> "CrisisDetector":
+        parsed = load_referral_doc(path)
+        if parsed is None:
+            return cls(DEFAULT_CATEGORIES)
+        return cls(parsed["categories"], parsed["statement"])
+
+    def centroids(self) -> np.ndarray:
+        """Normalized centroid per category (rows in ``categories`` order); encoded once."""
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    rows = []
+                    for category in self.categories:
+                        vectors = encode([category] + CRISIS_EXAMPLES.get(category, []), normalize=True).embeddings
+                        centroid = vectors.mean(axis=0)
+                        rows.append(centroid / np.linalg.norm(centroid))
+                    self._centroids = np.vstack(rows).astype("float32")
+        return self._centroids
+
+    def match_phrases(self, text: str) -> Optional[CrisisSignal]:
+        match = self._pattern.search(_normalize(text))
+        if not match:
+            return None
+        return CrisisSignal(self._group_categories[match.lastgroup], "phrase", 1.0, match.group(0))
+
+    def match_embedding(self, text: str) -> Optional[CrisisSignal]:
+        # Sentence by sentence, so one crisis sentence in a long message is not diluted.
+        sentences = [s for s in _SENTENCE_SPLIT.split(text.strip()) if s.strip()][:MAX_SENTENCES]
+        if not sentences:
+            return None
+        similarities = encode(sentences, normalize=True).embeddings @ self.centroids().T
+        sentence, category = np.unravel_index(int(similarities.argmax()), similarities.shape)
+        score = float(similarities[sentence, category])
+        if score < self.threshold:
+            return None
+        return CrisisSignal(self.categories[category], "embedding", score, sentences[sentence])
+
+    def detect(self, text: str) -> Optional[CrisisSignal]:
+        return self.match_phrases(text) or self.match_embedding(text)
+
+    def response(self, signal: CrisisSignal) -> str:
+        return f"{self.statement}\n\n{CRISIS_RESOURCES}"
+
+
+_detector: Optional[CrisisDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> CrisisDetector:
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = CrisisDetector.from_referral_doc()
+    return _detector
+
+
+def detect_crisis(text: str) -> Optional[CrisisSignal]:
+    """The crisis signal in ``text``, or None. Never raises: a failed check must not block the reply."""
+    if not getattr(settings, "CRISIS_DETECTION_ENABLED", True) or not text.strip():
+        return None
+    detector = get_detector()
+    try:
+        return detector.detect(text)
+    except Exception as e:
+        logger.exception("Crisis embedding check failed: %s", e)
+        return detector.match_phrases(text)
+
+
+def crisis_response(signal: CrisisSignal) -> str:
+    return get_detector().response(signal)
@@ -0,0 +1,70 @@
+"""
+Keyword matching for the coaches' per-message checks.
+
+A KeywordMatcher compiles every keyword of every category into one regex
+whose alternation is factored as a trie (keywords sharing a prefix share the
+branch that matches it, and the longest keyword wins). The regex is a
+lookahead, so it is tried at every position of the message and one findall
+finds the keywords of all categories instead of one substring search per
+keyword. Keywords are lowercase. By default they match as substrings, like
+``keyword in text`` ("self" matches "myself", "goal" matches "goals"); with
+``whole_words`` only as whole words ("i" matches "I" but not "this").
+"""
+import re
+from typing import Dict, Hashable, Iterable, Mapping, Optional
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # a keyword ends here
+    return _node_regex(trie)
+
+
+def _node_regex(node: Dict) -> str:
+    branches = [re.escape(char) + _node_regex(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Greedy, so the longest keyword matches; backtracks to a shorter one if needed.
+    return f"(?:{body})?" if "" in node else body
+
+
+class KeywordMatcher:
+    def __init__(self, categories: Mapping[Hashable, Iterable[str]], whole_words: bool = False):
+        self.categories = list(categories)
+        # A keyword listed under several categories counts for each of them.
+        self._keyword_categories: Dict[str, list] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                self._keyword_categories.setdefault(keyword.lower(), []).append(category)
+        # Only the longest keyword starting at a position is found, so as substrings
+        # it also stands for the keywords that are its prefixes ("goals" for "goal").
+        self._hits: Dict[str, list] = {
+            found: [found] if whole_words else [keyword for keyword in self._keyword_categories if found.startswith(keyword)]
+            for found in self._keyword_categories
+        }
+        # Lookarounds rather than \b: the same boundaries, but cheaper for re to test at each position.
+        start, end = (r"(?<!\w)", r"(?!\w)") if whole_words else ("", "")
+        self._pattern = (
+            re.compile(rf"(?={start}({_trie_regex(self._keyword_categories)}){end})")
+            if self._keyword_categories else None
+        )
+
+    def counts(self, text: str) -> Dict[Hashable, int]:
+        """Distinct keywords found per category (every category present, 0 if none)."""
+        counts = dict.fromkeys(self.categories, 0)
+        if self._pattern is not None:
+            found = {keyword for match in self._pattern.findall(text.lower()) for keyword in self._hits[match]}
+            for keyword in found:
+                for category in self._keyword_categories[keyword]:
+                    counts[category] += 1
+        return counts
+
+    def first(self, text: str) -> Optional[Hashable]:
+        """The first category, in the order given, with any hit; None if there is none."""
+        counts = self.counts(text)
+        return next((category for category in self.categories if counts[category]), None)
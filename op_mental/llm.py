@@ -0,0 +1,415 @@
+"""
+One client for every OpenAI chat call the coaches make.
+
+Calls share a pooled HTTP session (requests for sync, aiohttp for async), get a
+per-call deadline, are retried with jittered exponential backoff on transient
+errors, and go through a circuit breaker: after repeated failures calls fail
+fast with ``LLMUnavailable`` for a cool-down period, so coaches return their
+fallback responses immediately instead of waiting on a provider that is down.
+Latency, outcome and token usage are recorded per call name in ``metrics``.
+
+Settings (Django settings when configured, otherwise the defaults below):
+LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_POOL_SIZE,
+LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_TIMEOUT.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import openai
+import requests
+from openai import error as openai_error
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: the request may succeed if sent again.
+RETRYABLE_ERRORS = (
+    openai_error.Timeout,
+    openai_error.APIConnectionError,
+    openai_error.RateLimitError,
+    openai_error.ServiceUnavailableError,
+    openai_error.TryAgain,
+)
+
+
+class LLMError(Exception):
+    """The LLM call failed (after retries); callers should use their fallback."""
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+def _setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        # Outside Django (e.g. the Streamlit console) settings are not configured.
+        return default
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After ``failure_threshold`` consecutive failed
+    calls it opens and rejects calls for ``reset_timeout`` seconds, then lets a
+    single trial call through (half-open); its outcome closes or re-opens it.
+    A trial that ends without an outcome (cancelled, interrupted) must give
+    its slot back with ``release_trial``, or no later call would get through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[str]:
+        """"call" while closed, "trial" for the half-open trial call, None if the call is rejected."""
+        with self._lock:
+            if self._opened_at is None:
+                return "call"
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return None
+            self._trial_in_flight = True
+            return "trial"
+
+    def release_trial(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("LLM circuit breaker opened after %d failures", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LLMMetrics:
+    """Per call-name counters, token totals and recent latencies (thread-safe)."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._window = window
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, latency: float, outcome: str, retries: int = 0,
+               prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    "calls": 0, "ok": 0, "failed": 0, "short_circuited": 0, "retries": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0,
+                    "latencies": deque(maxlen=self._window),
+                }
+            stats["calls"] += 1
+            stats[outcome] += 1
+            stats["retries"] += retries
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            if outcome != "short_circuited":
+                stats["latencies"].append(latency)
+        logger.debug("llm %s %s in %.3fs (retries=%d, tokens=%d+%d)",
+                     name, outcome, latency, retries, prompt_tokens, completion_tokens)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                latencies = sorted(stats["latencies"])
+                entry = {key: value for key, value in stats.items() if key != "latencies"}
+                if latencies:
+                    entry["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+                    entry["latency_p95_ms"] = round(latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000, 1)
+                result[name] = entry
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def _usage(response) -> Dict[str, int]:
+    usage = response.get("usage") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+    }
+
+
+class LLMClient:
+    def __init__(self, timeout: float = 30.0, max_retries: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, pool_size: int = 100,
+                 breaker: CircuitBreaker = None, metrics: LLMMetrics = None) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or LLMMetrics()
+
+        # One keep-alive pool for every sync call; retries are ours, not urllib3's.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # openai 0.28 uses this session for every sync request in the process.
+        openai.requestssession = self._session
+        # aiohttp sessions are bound to an event loop, so keep one per loop (see _aiohttp_session).
+        self._async_sessions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_settings(cls) -> "LLMClient":
+        return cls(
+            timeout=_setting("LLM_TIMEOUT", 30.0),
+            max_retries=_setting("LLM_MAX_RETRIES", 2),
+            backoff_base=_setting("LLM_BACKOFF_BASE", 0.5),
+            backoff_max=_setting("LLM_BACKOFF_MAX", 8.0),
+            pool_size=_setting("LLM_POOL_SIZE", 100),
+            breaker=CircuitBreaker(
+                failure_threshold=_setting("LLM_BREAKER_FAILURE_THRESHOLD", 5),
+                reset_timeout=_setting("LLM_BREAKER_RESET_TIMEOUT", 30.0),
+            ),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: a random delay up to the exponential cap.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _aiohttp_session(self):
+        # Only the ASGI server's long-lived loop (main thread) gets a pooled
+        # session. async_to_sync runs each call on a throwaway loop in a worker
+        # thread, where a pooled session would outlive its loop; there openai's
+        # own per-request session is used.
+        if threading.current_thread() is not threading.main_thread():
+            return None
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+            self._async_sessions[loop] = session
+        return session
+
+    def _check_breaker(self, name: str) -> bool:
+        # Whether this call is the breaker's half-open trial.
+        admitted = self.breaker.admit()
+        if admitted is None:
+            self.metrics.record(name, 0.0, "short_circuited")
+            raise LLMUnavailable("LLM provider unavailable (circuit open)")
+        return admitted == "trial"
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise openai_error.Timeout("LLM call deadline exceeded")
+        return min(self.timeout, remaining)
+
+    def _fail(self, name: str, start: float, attempt: int, exc: Exception) -> LLMError:
+        # Only provider-side failures count towards opening the breaker; a
+        # rejected request (e.g. too many tokens) means the provider is up.
+        if isinstance(exc, RETRYABLE_ERRORS + (openai_error.APIError,)):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self.metrics.record(name, time.monotonic() - start, "failed", retries=attempt)
+        logger.warning("LLM call %s failed after %d attempt(s): %s", name, attempt + 1, exc)
+        return LLMError(str(exc))
+
+    def create(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None,
+               stream: bool = False, **params):
+        """
+        Run a ChatCompletion with retries and return the raw response (or the
+        chunk iterator when ``stream``). ``timeout`` is the deadline for the whole
+        call, retries included. Raises ``LLMError``.
+        """
+        trial = self._check_breaker(name)
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = openai.ChatCompletion.create(
+                        model=model, messages=messages, stream=stream,
+                        request_timeout=self._attempt_timeout(deadline), **params
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    delay = self._backoff(attempt)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise self._fail(name, start, attempt, e) from e
+                    time.sleep(delay)
+                    attempt += 1
+                except Exception as e:
+                    raise self._fail(name, start, attempt, e) from e
+        except LLMError:
+            raise
+        except BaseException:
+            # Interrupted with no outcome: give the half-open trial slot back.
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+        # An opened stream is a successful call as far as the breaker is concerned, so a
+        # stream the caller abandons (or never reads) cannot hold the trial slot.
+        self.breaker.record_success()
+        if stream:
+            return self._relay_stream(name, response, start, attempt)
+        self.metrics.record(name, time.monotonic() - start, "ok", retries=attempt, **_usage(response))
+        return response
+
+    def _relay_stream(self, name: str, chunks, start: float, attempt: int):
+        completion_chunks = 0
+        try:
+            for chunk in chunks:
+                completion_chunks += 1
+                yield chunk
+        except Exception as e:
+            raise self._fail(name, start, attempt, e) from e
+        self.breaker.record_success()
+        # Streams report no usage; each chunk carries about one token.
+        self.metrics.record(name, time.monotonic() - start, "ok", retries=attempt,
+                            completion_tokens=completion_chunks)
+
+    def chat(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None, **params) -> str:
+        """Return the reply text of a chat completion. Raises ``LLMError``."""
+        response = self.create(name, messages, model=model, timeout=timeout, **params)
+        return response.choices[0].message.content
+
+    def stream_chat(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None,
+                    **params) -> Iterator[str]:
+        """Yield the reply text as it is generated. Raises ``LLMError``."""
+        for chunk in self.create(name, messages, model=model, timeout=timeout, stream=True, **params):
+            delta = chunk.choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+    async def acreate(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None,
+                      stream: bool = False, **params):
+        """Async ``create``."""
+        trial = self._check_breaker(name)
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        attempt = 0
+        try:
+            openai.aiosession.set(self._aiohttp_session())
+            while True:
+                try:
+                    response = await openai.ChatCompletion.acreate(
+                        model=model, messages=messages, stream=stream,
+                        request_timeout=self._attempt_timeout(deadline), **params
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    delay = self._backoff(attempt)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise self._fail(name, start, attempt, e) from e
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                except Exception as e:
+                    raise self._fail(name, start, attempt, e) from e
+        except LLMError:
+            raise
+        except BaseException:
+            # Cancelled (asyncio.CancelledError is not an Exception): give the trial slot back.
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+        self.breaker.record_success()  # see create()
+        if stream:
+            return self._arelay_stream(name, response, start, attempt)
+        self.metrics.record(name, time.monotonic() - start, "ok", retries=attempt, **_usage(response))
+        return response
+
+    async def _arelay_stream(self, name: str, chunks, start: float, attempt: int):
+        completion_chunks = 0
+        try:
+            async for chunk in chunks:
+                completion_chunks += 1
+                yield chunk
+        except Exception as e:
+            raise self._fail(name, start, attempt, e) from e
+        self.breaker.record_success()
+        self.metrics.record(name, time.monotonic() - start, "ok", retries=attempt,
+                            completion_tokens=completion_chunks)
+
+    async def achat(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None,
+                    **params) -> str:
+        response = await self.acreate(name, messages, model=model, timeout=timeout, **params)
+        return response.choices[0].message.content
+
+    async def astream_chat(self, name: str, messages: List[Dict], model: str = "gpt-4", timeout: float = None,
+                           **params) -> AsyncIterator[str]:
+        chunks = await self.acreate(name, messages, model=model, timeout=timeout, stream=True, **params)
+        async for chunk in chunks:
+            delta = chunk.choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """The process-wide client, created from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient.from_settings()
+    return _client
+
+
+def chat(name: str, messages: List[Dict], **kwargs) -> str:
+    return get_client().chat(name, messages, **kwargs)
+
+
+def stream_chat(name: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+    return get_client().stream_chat(name, messages, **kwargs)
+
+
+async def achat(name: str, messages: List[Dict], **kwargs) -> str:
+    return await get_client().achat(name, messages, **kwargs)
+
+
+def astream_chat(name: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+    return get_client().astream_chat(name, messages, **kwargs)
+
+
+def metrics() -> Dict[str, Dict]:
+    return get_client().metrics.snapshot()
@@ -1,19 +1,41 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
 from rest_framework import status
 
 class ForceLogoutMiddleware:
+    # Async-capable so ASGI requests to async views never get pinned to a thread here.
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _logged_out_response(self):
+        return JsonResponse(
+            {'detail': 'You have been logged out from another device.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         if request.user.is_authenticated and request.user.force_logout_required:
             # The user needs to be logged out. We clear the flag and return a 401 response.
             request.user.force_logout_required = False
             request.user.save()
-            return JsonResponse(
-                {'detail': 'You have been logged out from another device.'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+            return self._logged_out_response()
 
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated and user.force_logout_required:
+            user.force_logout_required = False
+            await user.asave()
+            return self._logged_out_response()
+
+        return await self.get_response(request)
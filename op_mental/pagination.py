@@ -0,0 +1,157 @@
+"""
+Keyset (cursor) pagination for the history endpoints.
+
+Pages are ordered by a timestamp field then the primary key, and the cursor is
+the (timestamp, pk) of the last row sent, so every page is one indexed range
+scan (``WHERE (ts, id) > (cursor) ORDER BY ts, id LIMIT n``) however deep the
+client has paged, unlike OFFSET. Each list needs a composite index on
+(filter column, timestamp, id).
+
+Query parameters:
+    cursor      opaque value from the previous response's "next" link
+    page_size   rows per page (default HISTORY_PAGE_SIZE, at most HISTORY_MAX_PAGE_SIZE)
+    since       ISO 8601 timestamp; only rows created after it (delta sync)
+    order       "asc" or "desc", overriding the view's default direction
+
+Responses are ``{"next": <url or null>, "results": [...]}``.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_cursor(position) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValidationError({"cursor": "Invalid cursor."})
+
+
+def _aware(value: datetime) -> datetime:
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def _parse_since(value: str) -> datetime:
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValidationError({"since": "Expected an ISO 8601 timestamp."})
+    return _aware(since)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Views set ``keyset_field`` (the timestamp field, default "created_at") and
+    ``keyset_descending`` (default False, oldest first).
+    """
+    page_size = getattr(settings, "HISTORY_PAGE_SIZE", 50)
+    max_page_size = getattr(settings, "HISTORY_MAX_PAGE_SIZE", 200)
+
+    def _page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            raise ValidationError({"page_size": "Expected an integer."})
+        return min(max(size, 1), self.max_page_size)
+
+    def _descending(self, request, view) -> bool:
+        order = request.query_params.get("order")
+        if order in ("asc", "desc"):
+            return order == "desc"
+        return getattr(view, "keyset_descending", False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field = getattr(view, "keyset_field", "created_at")
+        descending = self._descending(request, view)
+        size = self._page_size(request)
+
+        since = request.query_params.get("since")
+        if since:
+            queryset = queryset.filter(**{f"{field}__gt": _parse_since(since)})
+
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            try:
+                value, pk = _decode_cursor(cursor)
+                value = parse_datetime(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is None:
+                raise ValidationError({"cursor": "Invalid cursor."})
+            op = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"pk__{op}": pk})
+            )
+
+        prefix = "-" if descending else ""
+        rows = list(queryset.order_by(f"{prefix}{field}", f"{prefix}pk")[:size + 1])
+        self.next_position = None
+        if len(rows) > size:
+            rows = rows[:size]
+            last = rows[-1]
+            self.next_position = [getattr(last, field).isoformat(), str(last.pk)]
+        return rows
+
+    def paginate_sequence(self, items: Sequence[dict], request, timestamp_key: str = "timestamp"):
+        """
+        Page a list stored in a JSON field. The cursor is the position in the
+        list; ``since`` compares the items' ISO ``timestamp_key`` values.
+        """
+        self.request = request
+        size = self._page_size(request)
+        start = 0
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            start = _decode_cursor(cursor)
+            if not isinstance(start, int) or start < 0:
+                raise ValidationError({"cursor": "Invalid cursor."})
+
+        since = request.query_params.get("since")
+        if since:
+            since = _parse_since(since)
+
+        page, position = [], start
+        while position < len(items) and len(page) < size:
+            item = items[position]
+            position += 1
+            stamp = parse_datetime(item.get(timestamp_key) or "") if since else None
+            if since and (stamp is None or _aware(stamp) <= since):
+                continue
+            page.append(item)
+        self.next_position = position if position < len(items) else None
+        return page
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), "cursor", _encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,169 @@
+"""
+Token-budgeted prompt assembly.
+
+A prompt is made of named sections. ``PromptBuilder.build`` always keeps the
+required sections (instructions, the current message), then fits the optional
+ones into what is left of the budget in priority order: each is first cut to
+its own cap, then to the remaining budget, and dropped when nothing is left.
+List sections (conversation turns, ranked snippets) lose whole items, from the
+start or the end, so an item is never cut in half.
+
+Tokens are counted with tiktoken when it and its encoding files are available,
+otherwise estimated from the character count (deliberately on the high side).
+"""
+import logging
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Fallback estimate; English prose averages about four characters per token,
+# three keeps the estimate from undercounting.
+CHARS_PER_TOKEN = 3
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        with _encodings_lock:
+            if model not in _encodings:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # The encoding files are downloaded on first use; offline, estimate instead.
+                    logger.warning("tiktoken encoding for %s unavailable, estimating tokens: %s", model, e)
+                    _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens, keeping the beginning."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN - 3] + "..."
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens - 1]) + "..."
+
+
+class PromptSection(NamedTuple):
+    name: str
+    content: Union[str, List[str]]
+    header: str = ""
+    required: bool = False
+    max_tokens: Optional[int] = None
+    priority: int = 0
+    trim_from: str = "start"
+
+
+class PromptBuilder:
+    """
+    Collects sections with ``add`` and joins the ones that fit with ``build``.
+
+    Sections appear in the order they were added; ``priority`` (lower first)
+    only decides who gets the budget first. ``usage`` maps each section name
+    to the tokens it was given in the last build.
+    """
+
+    def __init__(self, budget: int, model: str = "gpt-4", separator: str = "\n\n"):
+        self.budget = budget
+        self.model = model
+        self.separator = separator
+        self.sections: List[PromptSection] = []
+        self.usage: Dict[str, int] = {}
+
+    def add(self, name: str, content: Union[str, Sequence[str]], header: str = "", required: bool = False,
+            max_tokens: Optional[int] = None, priority: Optional[int] = None,
+            trim_from: str = "start") -> "PromptBuilder":
+        """
+        Add a section. ``content`` is a string, or a list of items trimmed by
+        dropping whole items from ``trim_from``: "start" for oldest-first turns,
+        "end" for best-first search results. ``header`` is put on
+        its own line above the content, and left out with it when the content
+        is empty or does not fit. Required sections are still cut to
+        ``max_tokens`` when one is given.
+        """
+        if not isinstance(content, str):
+            content = list(content)
+        if priority is None:
+            priority = len(self.sections)
+        self.sections.append(PromptSection(name, content, header, required, max_tokens, priority, trim_from))
+        return self
+
+    def _fit(self, section: PromptSection, limit: Optional[int]) -> str:
+        if section.max_tokens is not None:
+            limit = section.max_tokens if limit is None else min(limit, section.max_tokens)
+        if limit is not None and section.header:
+            limit -= count_tokens(section.header, self.model) + 1
+
+        if isinstance(section.content, str):
+            body = section.content if limit is None else truncate_tokens(section.content, limit, self.model)
+        elif limit is None:
+            body = "\n".join(section.content)
+        else:
+            items = section.content[::-1] if section.trim_from == "start" else section.content
+            kept, used = [], 0
+            for item in items:
+                cost = count_tokens(item, self.model) + 1  # the joining newline
+                if used + cost > limit:
+                    break
+                kept.append(item)
+                used += cost
+            body = "\n".join(kept[::-1] if section.trim_from == "start" else kept)
+
+        if not body.strip():
+            return ""
+        return f"{section.header}\n{body}" if section.header else body
+
+    def build(self) -> str:
+        separator_cost = count_tokens(self.separator, self.model)
+        fitted: Dict[int, str] = {}
+
+        # Required sections first; they are kept even when they exceed the budget.
+        remaining = self.budget
+        for position, section in enumerate(self.sections):
+            if section.required:
+                text = self._fit(section, None)
+                fitted[position] = text
+                remaining -= count_tokens(text, self.model) + separator_cost
+
+        optional = [(section.priority, position) for position, section in enumerate(self.sections)
+                    if not section.required]
+        for _, position in sorted(optional):
+            section = self.sections[position]
+            if remaining - separator_cost <= 0:
+                break
+            text = self._fit(section, remaining - separator_cost)
+            if text:
+                fitted[position] = text
+                remaining -= count_tokens(text, self.model) + separator_cost
+
+        self.usage = {self.sections[position].name: count_tokens(text, self.model)
+                      for position, text in fitted.items()}
+        return self.separator.join(fitted[position] for position in sorted(fitted) if fitted[position])
+
+    def token_count(self) -> int:
+        return sum(self.usage.values())
@@ -96,6 +96,71 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'op_mental.wsgi.application'
+ASGI_APPLICATION = 'op_mental.asgi.application'
+
+# Shared OpenAI client (see op_mental/llm.py): per-call deadline in seconds, retries with
+# jittered backoff, and a circuit breaker that fails fast to the coaches' fallback replies
+LLM_TIMEOUT = 30
+LLM_MAX_RETRIES = 2
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 8
+LLM_POOL_SIZE = 100
+LLM_BREAKER_FAILURE_THRESHOLD = 5
+LLM_BREAKER_RESET_TIMEOUT = 30
+
+# Prompt token budgets (see op_mental/prompt_budget.py). Chat prompts carry a rolling summary
+# of older turns, refreshed every CHAT_SUMMARY_EVERY_TURNS turns, plus the CHAT_RECENT_TURNS
+# latest turns verbatim; per-section caps are in chatbot/chatbot_logic.py
+CHAT_PROMPT_TOKEN_BUDGET = 3500
+CHAT_SUMMARY_MAX_TOKENS = 300
+CHAT_RECENT_TURNS = 4
+CHAT_SUMMARY_EVERY_TURNS = 6
+JOURNAL_INPUT_MAX_TOKENS = 1200
+JOURNAL_HISTORY_MAX_TOKENS = 400
+# Per-process LRU of chat sessions' memory indexes (see chatbot/memory_index.py); a session
+# is dropped after CHAT_MEMORY_CACHE_TTL seconds without a message
+CHAT_MEMORY_CACHE_SIZE = 256
+CHAT_MEMORY_CACHE_TTL = 15 * 60
+# Opt-in semantic cache of general-chat replies (see chatbot/response_cache.py), for short
+# messages from sessions without saved history; similarity is cosine, TTL in seconds
+CHAT_RESPONSE_CACHE_ENABLED = False
+CHAT_RESPONSE_CACHE_THRESHOLD = 0.95
+CHAT_RESPONSE_CACHE_TTL = 6 * 60 * 60
+CHAT_RESPONSE_CACHE_SIZE = 2000
+
+# Free tier (see chatbot/metering.py): messages a user without an active subscription may
+# send, shared across the coaches listed here ("chatbot", "journal", "mindset", "challenge")
+FREE_MESSAGE_LIMIT = 30
+FREE_TIER_METERED_COACHES = ['chatbot']
+# Subscription entitlements are cached (see subscriptions/entitlements.py) until the
+# subscription's end_date, or this many seconds for users without one. Coaches listed in
+# SUBSCRIBER_ONLY_COACHES refuse users without an active subscription
+ENTITLEMENT_CACHE_TTL = 5 * 60
+SUBSCRIBER_ONLY_COACHES = []
+
+# Keyset pagination of the history endpoints (see op_mental/pagination.py)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Crisis check that runs before any coach LLM call (see op_mental/crisis.py). By default a
+# detected crisis is answered with the referral statement and resources only; set
+# CRISIS_FOLLOW_WITH_REPLY to also send the coach's reply after them
+CRISIS_DETECTION_ENABLED = True
+CRISIS_SIMILARITY_THRESHOLD = 0.6
+CRISIS_FOLLOW_WITH_REPLY = False
+CRISIS_REFERRAL_DOC = os.path.join(BASE_DIR, 'media', 'knowledge_docs', 'Mental_Health_Referral_Logic.txt')
+
+# Materialized journaling statistics (see journaling/stats.py): days of per-day session
+# counts kept for the activity histogram and the 30/7-day totals
+JOURNAL_STATS_HISTORY_DAYS = 365
+JOURNAL_STATS_MAX_ACTIVITY_DAYS = 365
+
+# Threads the async coach views use for blocking coach logic (see op_mental/concurrency.py)
+COACH_THREAD_POOL_SIZE = int(os.environ.get('COACH_THREAD_POOL_SIZE', 200))
+# ...and for the independent calls coach logic fans out, such as the journal summary's insights
+# and recommendations, which share a JOURNAL_SUMMARY_TIMEOUT-second deadline
+COACH_FANOUT_POOL_SIZE = int(os.environ.get('COACH_FANOUT_POOL_SIZE', 50))
+JOURNAL_SUMMARY_TIMEOUT = 20
 
 
 # Database
@@ -163,6 +228,29 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Persisted FAISS snapshots of the knowledge base (see knowledge_base/index_store.py)
+KNOWLEDGE_INDEX_DIR = os.environ.get('KNOWLEDGE_INDEX_DIR', os.path.join(BASE_DIR, 'knowledge_index'))
+# Knowledge documents are split into overlapping chunks (in characters) before embedding
+KNOWLEDGE_CHUNK_SIZE = 800
+KNOWLEDGE_CHUNK_OVERLAP = 150
+KNOWLEDGE_EMBED_BATCH_SIZE = 32
+# Encode calls from concurrent requests are coalesced for up to this long into one model call (0 disables)
+KNOWLEDGE_EMBED_MAX_BATCH_SIZE = 64
+KNOWLEDGE_EMBED_MAX_WAIT_MS = 5
+# "auto" uses exact search for small corpora and HNSW/IVF as they grow (see knowledge_base/index_factory.py);
+# an approximate index is only used if it reaches KNOWLEDGE_INDEX_MIN_RECALL against exact search
+KNOWLEDGE_INDEX_MODE = os.environ.get('KNOWLEDGE_INDEX_MODE', 'auto')
+KNOWLEDGE_INDEX_HNSW_MIN_VECTORS = 20000
+KNOWLEDGE_INDEX_IVF_MIN_VECTORS = 500000
+KNOWLEDGE_INDEX_HNSW_EF_SEARCH = 64
+KNOWLEDGE_INDEX_IVF_NPROBE = 16
+KNOWLEDGE_INDEX_MIN_RECALL = 0.95
+# Per-process LRU caches of query embeddings and of knowledge query results (TTL in seconds, None = no expiry)
+KNOWLEDGE_QUERY_CACHE_SIZE = 1024
+KNOWLEDGE_QUERY_CACHE_TTL = 60 * 60
+KNOWLEDGE_RESULT_CACHE_SIZE = 1024
+KNOWLEDGE_RESULT_CACHE_TTL = 10 * 60
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -3,12 +3,18 @@ import openai
 from datetime import datetime
 import json
 import os
+import sys
 from typing import Dict, List, Any
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+# Share the backend's embedding model registry. Streamlit only puts this
+# script's folder on sys.path, so add the project root as well.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from knowledge_base.embeddings import encode
+from op_mental import llm
+
 
 load_dotenv()
 
@@ -22,7 +28,6 @@ st.set_page_config(
 class ChatSystem:
     def __init__(self, api_key: str):
         openai.api_key = api_key
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
         self.conversation_history = []
         self.embeddings = []
         self.index = None
@@ -38,7 +43,7 @@ class ChatSystem:
         })
         
         # Create embedding
-        embedding = self.model.encode([conversation])
+        embedding = encode([conversation]).embeddings
         self.embeddings.append(embedding[0])
         
         # Update FAISS index
@@ -62,7 +67,7 @@ class ChatSystem:
         if self.index is None or len(self.conversation_history) == 0:
             return []
         
-        query_embedding = self.model.encode([query]).astype('float32')
+        query_embedding = encode([query]).embeddings
         scores, indices = self.index.search(query_embedding, min(top_k, len(self.conversation_history)))
         
         relevant_context = []
@@ -97,12 +102,12 @@ class ChatSystem:
         """
         
         try:
-            response = openai.ChatCompletion.create(
+            return llm.chat(
+                "console.summary",
+                [{"role": "user", "content": summary_prompt}],
                 model="gpt-4o",
-                messages=[{"role": "user", "content": summary_prompt}],
                 max_tokens=500
             )
-            return response.choices[0].message.content
         except Exception as e:
             return f"Error generating summary: {str(e)}"
 
@@ -124,7 +129,7 @@ class ChatSystem:
                 # Rebuild embeddings and FAISS index
                 self.embeddings = []
                 for conv in self.conversation_history:
-                    embedding = self.model.encode([conv['full_conversation']])
+                    embedding = encode([conv['full_conversation']]).embeddings
                     self.embeddings.append(embedding[0])
                 
                 self._update_faiss_index()
@@ -232,14 +237,14 @@ class GeneralChatSystem(ChatSystem):
         """
         
         try:
-            response = openai.ChatCompletion.create(
+            bot_response = llm.chat(
+                "console.response",
+                [{"role": "user", "content": full_prompt}],
                 model="gpt-4",
-                messages=[{"role": "user", "content": full_prompt}],
                 max_tokens=800,
                 temperature=0.7
             )
             
-            bot_response = response.choices[0].message.content
             self.add_to_memory(message, bot_response)
             return bot_response
             
@@ -0,0 +1,100 @@
+"""
+Cached subscription entitlements.
+
+A user's entitlement (subscribed or not, and until when) is read from the
+cache, so checking it on every coach message costs no database query on a
+hit. A subscribed entry expires from the cache exactly at the subscription's
+end_date (and is re-checked against the clock on read); an unsubscribed entry
+is kept for ENTITLEMENT_CACHE_TTL seconds. Saving or deleting a
+UserSubscription (the Stripe webhook, the admin) invalidates the user's entry,
+see subscriptions/signals.py.
+
+If the cache is unreachable the entitlement is read from the database, so an
+outage of the cache never locks subscribers out.
+"""
+import logging
+import math
+import time
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import UserSubscription
+
+logger = logging.getLogger(__name__)
+
+ENTITLEMENT_CACHE_ALIAS = getattr(settings, "ENTITLEMENT_CACHE_ALIAS", "default")
+ENTITLEMENT_CACHE_TTL = getattr(settings, "ENTITLEMENT_CACHE_TTL", 5 * 60)
+
+
+class Entitlement(NamedTuple):
+    subscribed: bool
+    expires_at: Optional[float] = None  # Unix time of the latest active end_date
+
+    def is_current(self) -> bool:
+        return not self.subscribed or self.expires_at > time.time()
+
+
+def _cache_key(user_id) -> str:
+    return f"entitlement:{user_id}"
+
+
+def _load(user) -> Entitlement:
+    end_date = UserSubscription.objects.filter(
+        user=user, status='active', end_date__gt=timezone.now()
+    ).aggregate(end_date=Max('end_date'))['end_date']
+    if end_date is None:
+        return Entitlement(False)
+    return Entitlement(True, end_date.timestamp())
+
+
+def _timeout(entitlement: Entitlement) -> int:
+    if not entitlement.subscribed:
+        return ENTITLEMENT_CACHE_TTL
+    return max(math.ceil(entitlement.expires_at - time.time()), 1)
+
+
+def get_entitlement(user) -> Entitlement:
+    """The user's entitlement: from the request's user object, then the cache, then the database."""
+    # Memoized on the user instance, so a permission check and the view share one lookup.
+    entitlement = getattr(user, "_entitlement", None)
+    if entitlement is not None and entitlement.is_current():
+        return entitlement
+
+    cache = caches[ENTITLEMENT_CACHE_ALIAS]
+    key = _cache_key(user.pk)
+    try:
+        entitlement = cache.get(key)
+    except Exception as e:
+        logger.warning("Entitlement cache read failed, using the database: %s", e)
+        entitlement = None
+
+    if entitlement is None or not entitlement.is_current():
+        entitlement = _load(user)
+        try:
+            cache.set(key, entitlement, timeout=_timeout(entitlement))
+        except Exception as e:
+            logger.warning("Entitlement cache write failed: %s", e)
+
+    user._entitlement = entitlement
+    return entitlement
+
+
+async def aget_entitlement(user) -> Entitlement:
+    """Async get_entitlement()."""
+    entitlement = getattr(user, "_entitlement", None)
+    if entitlement is not None and entitlement.is_current():
+        return entitlement
+    return await sync_to_async(get_entitlement)(user)
+
+
+def invalidate_entitlement(user_id) -> None:
+    try:
+        caches[ENTITLEMENT_CACHE_ALIAS].delete(_cache_key(user_id))
+    except Exception as e:
+        # Subscribed entries still expire at end_date; unsubscribed ones within ENTITLEMENT_CACHE_TTL.
+        logger.error("Entitlement cache invalidation failed for user %s: %s", user_id, e)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .entitlements import get_entitlement
+
+
+class HasCoachEntitlement(BasePermission):
+    """
+    Loads the user's cached entitlement (no database query on a cache hit) and
+    keeps users without an active subscription out of the coaches listed in
+    SUBSCRIBER_ONLY_COACHES. The view names its coach in a ``coach_name`` attribute.
+    Use after IsAuthenticated.
+    """
+    message = "This coach is available with an active subscription."
+
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        entitlement = get_entitlement(request.user)
+        request.entitlement = entitlement
+        coach = getattr(view, "coach_name", None)
+        return entitlement.subscribed or coach not in getattr(settings, "SUBSCRIBER_ONLY_COACHES", [])
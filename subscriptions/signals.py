@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import UserSubscription
+from .entitlements import invalidate_entitlement
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def user_subscription_changed(sender, instance, **kwargs):
+    """Drops the user's cached entitlement whenever one of their subscriptions changes."""
+    invalidate_entitlement(instance.user_id)
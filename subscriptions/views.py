@@ -125,6 +125,7 @@ def stripe_webhook(request):
                 plan = SubscriptionPlan.objects.get(id=plan_id)
                 logger.info(f"Webhook: Found user {user.email} and plan {plan.name}")
                 end_date = timezone.now() + timezone.timedelta(days=plan.duration_days)
+                # Creating it invalidates the user's cached entitlement (subscriptions/signals.py).
                 UserSubscription.objects.create(
                     user=user,
                     plan=plan,